@@ -0,0 +1,50 @@
+import re
+from src.TextIndex import TfidfIndex, tokenize
+
+class AnimationSelector:
+    """
+    Chooses a character's clip from the reply text without asking the model.
+    1. Keyword rules: an animations.txt line may end with [word, word, ...]; a whole-word hit in the reply wins.
+    2. Otherwise a TF-IDF classifier over each clip's name + description picks the closest clip.
+    Anything scoring under the threshold returns None, so the caller can fall back (tool choice or default).
+    """
+
+    def __init__(self, animation_names, descriptions, keywords=None, threshold=0.2):
+        self.names = {name.lower(): name for name in animation_names}
+        self.keywords = {name: [k.lower() for k in words] for name, words in (keywords or {}).items()}
+        self.threshold = threshold
+
+        self.index = TfidfIndex()
+        for key, name in self.names.items():
+            # Underscores in file names are word breaks ("wave_hello" -> "wave hello")
+            self.index.add(key, f"{name.replace('_', ' ')} {descriptions.get(key, '')}")
+        self.index.build()
+
+    def select(self, reply_text):
+        """Returns (animation name, confidence); name is None when nothing is confident enough."""
+        if not self.names or not reply_text:
+            return None, 0.0
+
+        # 1. Keyword rules
+        words = set(tokenize(reply_text))
+        best, hits = None, 0
+        for key, keywords in self.keywords.items():
+            count = sum(1 for keyword in keywords if keyword in words or (" " in keyword and keyword in reply_text.lower()))
+            if key in self.names and count > hits:
+                best, hits = key, count
+        if best:
+            return best, 1.0
+
+        # 2. Vector similarity against the descriptions
+        matches = self.index.query(reply_text, k=1)
+        if matches and matches[0][1] >= self.threshold:
+            return matches[0]
+        return None, matches[0][1] if matches else 0.0
+
+def split_keywords(description):
+    """Splits 'Waves hello. [hi, hello]' into ('Waves hello.', ['hi', 'hello'])."""
+    match = re.search(r"\[([^\]]*)\]\s*$", description)
+    if not match:
+        return description, []
+    words = [w.strip() for w in match.group(1).split(",") if w.strip()]
+    return description[:match.start()].strip(), words
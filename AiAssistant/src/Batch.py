@@ -0,0 +1,232 @@
+"""
+Batch pre-render: runs a dialogue script through the chat model and turns every reply into a
+named Veo clip in the character's folder, with an animations.txt entry so the app can play it.
+
+Usage (from the AiAssistant folder):
+    python -m src.Batch script.txt [--parallel 2] [--veo-per-minute 4] [--retries 3]
+
+Script format: a [Character] header, then one user line per clip. Prefix a line with "name |"
+to choose the animation name; otherwise one is made from the line. Lines starting with # are ignored.
+
+    [Wizard]
+    greeting | Hello there, who are you?
+    What is in that book?
+
+Progress is checkpointed after every chat reply and every finished clip, so an interrupted run
+picks up where it stopped when started again with the same script.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.ClipLibrary import clip_slug, copy_clip
+from src.TextIndex import tokenize
+from src.VeoScheduler import construct_veo_prompt
+
+def parse_script(path):
+    """Returns (character, animation name, user line) triples in script order."""
+    entries, character = [], None
+    with open(path, "r", encoding="utf-8") as f:
+        for number, raw in enumerate(f, 1):
+            line = raw.strip()
+            if not line or line.startswith("#"):
+                continue
+            header = re.fullmatch(r"\[(.+)\]", line)
+            if header:
+                character = header.group(1).strip()
+                continue
+            if character is None:
+                raise ValueError(f"{path}:{number}: dialogue before the first [Character] header")
+            name, sep, text = line.partition("|")
+            if not sep:
+                name, text = "", line
+            name = clip_slug(name or text)
+            entries.append((character, name, text.strip()))
+    return entries
+
+class RateLimiter:
+    """Allows at most `per_minute` acquisitions in any sliding minute, shared by all threads."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+class Checkpoint:
+    """JSON file of per-clip progress: key -> {"line", "reply", "prompt", "status", "file"}."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.items = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.items = json.load(f)
+
+    def get(self, key):
+        with self.lock:
+            return dict(self.items.get(key, {}))
+
+    def update(self, key, **fields):
+        with self.lock:
+            self.items.setdefault(key, {}).update(fields)
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.items, f, indent=2)
+            os.replace(self.path + ".tmp", self.path)
+
+class BatchRenderer:
+    def __init__(self, model, registry, checkpoint, parallel=2, veo_per_minute=4, chat_per_minute=30, retries=3,
+                 backoff=10.0, chat_only=False):
+        self.model = model
+        self.registry = registry
+        self.checkpoint = checkpoint
+        self.parallel = parallel
+        self.veo_limiter = RateLimiter(veo_per_minute)
+        self.chat_limiter = RateLimiter(chat_per_minute)
+        self.retries = retries
+        self.backoff = backoff
+        self.chat_only = chat_only
+        self.animations_lock = threading.Lock()
+        self.failed = []
+
+    def run(self, entries):
+        self.registry.refresh()
+        # Chats run in script order on this thread (each character's lines build on each other);
+        # every reply's clip is handed to the pool as soon as it exists
+        with ThreadPoolExecutor(max_workers=self.parallel) as pool:
+            futures = []
+            for character, name, line in entries:
+                record = self.registry.get(character)
+                if not record or not record.idle_path:
+                    print(f"Skipping {character}/{name}: character not found or has no idle.png")
+                    self.failed.append(f"{character}/{name}")
+                    continue
+                key = f"{record.name}/{name}"
+                state = self.checkpoint.get(key)
+                if state.get("status") == "done" and os.path.exists(os.path.join(record.char_dir, state["file"])):
+                    print(f"Already rendered {key}")
+                    continue
+
+                prompt = state.get("prompt") if state.get("line") == line else None
+                if prompt is None:
+                    reply = self.chat(record, line)
+                    if reply is None:
+                        self.failed.append(key)
+                        continue
+                    prompt = construct_veo_prompt(reply)
+                    self.checkpoint.update(key, line=line, reply=reply, prompt=prompt, status="chatted")
+                    print(f"Chatted {key}: {reply[:60]!r}")
+
+                if not self.chat_only:
+                    futures.append((key, pool.submit(self.render, record, name, key)))
+            for key, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    # One bad clip (disk full, unreadable download) should not stop the rest of the run
+                    print(f"Rendering {key} failed: {e}")
+                    self.failed.append(key)
+
+        if self.failed:
+            print(f"{len(self.failed)} clip(s) failed: {', '.join(self.failed)}. Run again to retry them.")
+        return not self.failed
+
+    def chat(self, record, line):
+        # Each character gets its own batch session so script lines never mix with kiosk conversations
+        handle = self.model.open_session(record.prompt_for(self.model.tools, override_only=True), f"{record.name}@batch")
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+            self.chat_limiter.acquire()
+            outcome = self.model.chat_result(line, handle=handle)
+            if outcome:
+                return outcome[0]
+            print(f"  Chat attempt {attempt + 1} for {record.name} failed")
+        return None
+
+    def render(self, record, name, key):
+        state = self.checkpoint.get(key)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+            self.veo_limiter.acquire()
+            video_path, error = self.model.generate_veo_video(state["prompt"], record.idle_path, record.name)
+            if video_path:
+                break
+            print(f"  Veo attempt {attempt + 1} for {key} failed: {error}")
+        else:
+            self.failed.append(key)
+            return
+
+        filename = f"{name}.mp4"
+        copy_clip(video_path, os.path.join(record.char_dir, filename))
+        self.add_animation_entry(record, name, state)
+        self.checkpoint.update(key, status="done", file=filename)
+        print(f"Rendered {key} -> {filename}")
+
+    def add_animation_entry(self, record, name, state):
+        """Adds or replaces `name: description [keywords]` in the character's animations.txt."""
+        first_sentence = re.split(r"(?<=[.!?])\s", state["reply"].strip(), maxsplit=1)[0][:120]
+        keywords = list(dict.fromkeys(tokenize(state["line"])))[:6]
+        entry = f"{name}: {first_sentence}" + (f" [{', '.join(keywords)}]" if keywords else "")
+
+        path = os.path.join(record.char_dir, "animations.txt")
+        with self.animations_lock:
+            lines = []
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    lines = [line.rstrip("\n") for line in f if line.split(":", 1)[0].strip().lower() != name]
+            lines.append(entry)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(path + ".tmp", path)
+
+def main():
+    from dotenv import load_dotenv
+    from src.Model import AIModel
+    from src.CharacterRegistry import CharacterRegistry
+
+    parser = argparse.ArgumentParser(description="Pre-render Veo clips for a dialogue script.")
+    parser.add_argument("script")
+    parser.add_argument("--parallel", type=int, default=2, help="Veo generations running at once")
+    parser.add_argument("--veo-per-minute", type=float, default=4, help="Veo requests started per minute (0 = no limit)")
+    parser.add_argument("--chat-per-minute", type=float, default=30, help="chat requests per minute (0 = no limit)")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--checkpoint", help="progress file (default: <script>.checkpoint.json)")
+    parser.add_argument("--chat-only", action="store_true", help="write replies and prompts to the checkpoint without rendering")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not os.getenv("GEMINI_API_KEY"):
+        print("CRITICAL ERROR: GEMINI_API_KEY not found.")
+        sys.exit(1)
+
+    entries = parse_script(args.script)
+    model = AIModel(api_key=os.getenv("GEMINI_API_KEY"), veo_api_key=os.getenv("VEO_API_KEY"),
+                    system_instruction="You are a helpful assistant.")
+    registry = CharacterRegistry(os.path.join(os.getcwd(), "Characters"))
+    checkpoint = Checkpoint(args.checkpoint or args.script + ".checkpoint.json")
+    renderer = BatchRenderer(model, registry, checkpoint, args.parallel, args.veo_per_minute, args.chat_per_minute,
+                             args.retries, chat_only=args.chat_only)
+    try:
+        ok = renderer.run(entries)
+    finally:
+        model.close()
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
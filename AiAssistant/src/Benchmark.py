@@ -0,0 +1,260 @@
+"""
+Offline benchmark: drives AppController/AIView headlessly against the fakes in FakeBackends
+and writes machine-readable latency numbers that can be compared across commits.
+
+Usage (from the AiAssistant folder):
+    python -m src.Benchmark --profile default --out bench.json
+    python -m src.Benchmark --profile default --out new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+def install_sdk_stand_ins():
+    # The benchmark never talks to Google, so it also runs where the SDKs are not installed
+    try:
+        import google.generativeai, google.genai # noqa: F401
+    except ImportError:
+        import types as module_types
+        google = sys.modules.setdefault("google", module_types.ModuleType("google"))
+        for name in ("google.generativeai", "google.genai", "google.genai.types"):
+            sys.modules.setdefault(name, module_types.ModuleType(name))
+        google.generativeai = sys.modules["google.generativeai"]
+        google.genai = sys.modules["google.genai"]
+        google.genai.types = sys.modules["google.genai.types"]
+
+def stats(values):
+    values = sorted(values)
+    if not values:
+        return {"n": 0}
+    return {
+        "n": len(values),
+        "mean": statistics.fmean(values),
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "min": values[0],
+        "max": values[-1],
+    }
+
+class Benchmark:
+    def __init__(self, profile):
+        self.profile = profile
+        self.samples = {}   # metric -> list of values
+        self.events = {}    # event name -> first timestamp in the current run
+        self.workdir = tempfile.mkdtemp(prefix="aiassistant-bench-")
+
+    def record(self, metric, value):
+        if value is not None:
+            self.samples.setdefault(metric, []).append(value)
+
+    def mark(self, event):
+        self.events.setdefault(event, time.perf_counter())
+
+    def wait_until(self, predicate, timeout):
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            if time.perf_counter() > deadline:
+                return False
+            self.app.processEvents()
+            time.sleep(0.002)
+        return True
+
+    def setup(self):
+        from PyQt6.QtWidgets import QApplication
+        import src.Model as model_module
+        from src.FakeBackends import fake_legacy_sdk, fake_veo_sdk, FakeDownloader
+        from src.Model import AIModel
+        from src.View import AIView
+        from src.Controller import AppController
+        from src.CharacterRegistry import CharacterRegistry
+
+        # 1. Swap the SDK modules Model.py talks to for the local fakes
+        model_module.genai_legacy = fake_legacy_sdk(self.profile)
+        model_module.genai, model_module.types = fake_veo_sdk(self.profile)
+
+        # 2. Two throwaway characters so switching can be measured
+        source = os.path.join(os.getcwd(), "Characters", "Wizard")
+        char_base = os.path.join(self.workdir, "Characters")
+        for name in ("Wizard", "Apprentice"):
+            shutil.copytree(source, os.path.join(char_base, name))
+        self.sample_clip = os.path.join(source, "default.mp4")
+
+        # 3. Wire MVC exactly as Main.py does, minus the network
+        self.app = QApplication.instance() or QApplication(sys.argv[:1])
+        self.controller = AppController()
+        self.controller.current_char = "Wizard"
+        self.controller.char_base_path = char_base
+        self.controller.registry = CharacterRegistry(char_base)
+        self.model = AIModel(api_key="bench", veo_api_key="bench", system_instruction="You are a helpful assistant.",
+                             cache_dir=os.path.join(self.workdir, "VeoCache"))
+        self.model.downloader = FakeDownloader(self.sample_clip, self.profile)
+        self.view = AIView(self.controller)
+        self.controller.set_model(self.model)
+        self.controller.set_view(self.view)
+        self.view.show()
+        self.hook_view()
+
+    def hook_view(self):
+        view = self.view
+        append_chat_chunk, update_chat, play_video = view.append_chat_chunk, view.update_chat, view.play_video
+
+        def on_chunk(request_id, text):
+            self.mark("first_token")
+            append_chat_chunk(request_id, text)
+
+        def on_reply(text, request_id=None):
+            self.mark("reply_done")
+            update_chat(text, request_id)
+
+        def on_play(path):
+            self.mark("clip_start")
+            play_video(path)
+
+        view.append_chat_chunk, view.update_chat, view.play_video = on_chunk, on_reply, on_play
+        view.media_pool.frame_shown.connect(lambda: self.mark("first_frame"))
+
+    def bench_chat(self, runs):
+        self.view.veo_checkbox.setChecked(False)
+        for i in range(runs):
+            self.events = {}
+            start = time.perf_counter()
+            self.controller.handle_user_input(f"Tell me about spell number {i}", False)
+            if not self.wait_until(lambda: "reply_done" in self.events, 30):
+                print(f"  chat run {i} timed out")
+                continue
+            if "clip_start" in self.events:
+                self.wait_until(lambda: "first_frame" in self.events, 2)
+            self.record("time_to_first_token", self.events.get("first_token", self.events["reply_done"]) - start)
+            self.record("reply_total", self.events["reply_done"] - start)
+            if "clip_start" in self.events:
+                self.record("canned_reply_to_clip_start", self.events["clip_start"] - self.events["reply_done"])
+            if "first_frame" in self.events:
+                self.record("canned_reply_to_first_frame", self.events["first_frame"] - self.events["reply_done"])
+
+    def bench_veo(self, runs):
+        from src.FakeBackends import FakeVeoClient
+        self.view.veo_checkbox.setChecked(True)
+        ideal = self.profile.veo_start + self.profile.veo_generation
+        for i in range(runs):
+            self.events = {}
+            polls_before = FakeVeoClient.poll_calls_total
+            self.controller.handle_user_input(f"Show me illusion number {i}", True)
+            if not self.wait_until(lambda: "clip_start" in self.events, ideal * 4 + 30):
+                print(f"  veo run {i} timed out")
+                continue
+            self.wait_until(lambda: "first_frame" in self.events, 2)
+            clip_wait = self.events["clip_start"] - self.events["reply_done"]
+            self.record("veo_reply_to_clip_start", clip_wait)
+            # Anything beyond the fake's fixed generation time is scheduling/polling/download overhead
+            self.record("veo_polling_overhead", clip_wait - ideal)
+            self.record("veo_polls_per_job", FakeVeoClient.poll_calls_total - polls_before)
+            if "first_frame" in self.events:
+                self.record("veo_reply_to_first_frame", self.events["first_frame"] - self.events["reply_done"])
+        self.view.veo_checkbox.setChecked(False)
+
+    def bench_switch(self, runs):
+        visited = {self.controller.current_char}
+        for _ in range(runs):
+            for name in ("Apprentice", "Wizard"):
+                start = time.perf_counter()
+                self.controller.change_character(name)
+                self.app.processEvents()
+                # First visit builds a session; later visits reuse the pooled one
+                self.record("character_switch_warm" if name in visited else "character_switch_cold", time.perf_counter() - start)
+                visited.add(name)
+
+    def bench_memory(self, sessions=10):
+        self.model.max_sessions = sessions + self.model.max_sessions
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(sessions):
+            self.model.update_system_instruction(f"You are benchmark persona {i}.", f"bench-{i}")
+            self.model.chat(f"Hello persona {i}")
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.record("memory_per_session_bytes", (after - before) / sessions)
+
+    def run(self, runs, veo_runs):
+        self.setup()
+        try:
+            print("Chat...")
+            self.bench_chat(runs)
+            print("Character switching...")
+            self.bench_switch(max(2, runs // 2))
+            if veo_runs:
+                print("Veo...")
+                self.bench_veo(veo_runs)
+            print("Memory...")
+            self.bench_memory()
+        finally:
+            self.controller.shutdown()
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+        return {
+            "version": 1,
+            "commit": current_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "profile": self.profile.as_dict(),
+            "metrics": {metric: stats(values) for metric, values in sorted(self.samples.items())},
+        }
+
+def current_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def compare(old, new, tolerance):
+    """Prints p50 deltas. Returns the metrics that got slower than the tolerance allows."""
+    regressions = []
+    print(f"\n{'metric':32} {'old p50':>12} {'new p50':>12} {'change':>9}")
+    for metric, new_stats in new["metrics"].items():
+        old_stats = old.get("metrics", {}).get(metric)
+        if not old_stats or not old_stats.get("n") or not new_stats.get("n"):
+            continue
+        old_p50, new_p50 = old_stats["p50"], new_stats["p50"]
+        change = (new_p50 - old_p50) / abs(old_p50) if old_p50 else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(metric)
+            flag = "  REGRESSION"
+        print(f"{metric:32} {old_p50:12.4f} {new_p50:12.4f} {change:+8.1%}{flag}")
+    return regressions
+
+def main():
+    from src.FakeBackends import FakeProfile
+
+    parser = argparse.ArgumentParser(description="Offline latency benchmark for the AI assistant.")
+    parser.add_argument("--profile", default="default", choices=sorted(FakeProfile.PRESETS))
+    parser.add_argument("--runs", type=int, default=10, help="chat turns to time")
+    parser.add_argument("--veo-runs", type=int, default=2, help="Veo generations to time (0 to skip)")
+    parser.add_argument("--out", default="bench.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed p50 slowdown before failing")
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    install_sdk_stand_ins()
+
+    results = Benchmark(FakeProfile(args.profile)).run(args.runs, args.veo_runs)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
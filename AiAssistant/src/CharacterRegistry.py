@@ -0,0 +1,165 @@
+import os
+from src.AnimationSelector import AnimationSelector, split_keywords
+from src.ClipLibrary import ClipLibrary
+
+class CharacterRecord:
+    """Everything the app needs about one character folder, read from disk once."""
+
+    def __init__(self, name, char_dir, signature):
+        self.name = name
+        self.char_dir = char_dir
+        self.signature = signature  # mtimes used to tell whether the folder changed since it was indexed
+        self.idle_path = None
+        self.base_prompt = "You are a helpful assistant."
+        self.animations = {}        # lowercase name -> mp4 path
+        self.descriptions = {}      # lowercase name -> text from animations.txt
+        self.keywords = {}          # lowercase name -> trigger words from a trailing [..] in animations.txt
+        self.system_prompt = ""        # Prompt for when the model picks clips with set_animation
+        self.hybrid_system_prompt = "" # Prompt for when clips are picked locally and set_animation only overrides
+        self.local_system_prompt = ""  # Prompt for when AnimationSelector picks clips locally
+        self.selector = None
+        self.clips = None           # ClipLibrary, opened on first use
+        self.load()
+
+    def load(self):
+        files = {}
+        with os.scandir(self.char_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    files[entry.name.lower()] = entry.path
+
+        self.idle_path = files.get("idle.png")
+
+        config_path = files.get("config.txt")
+        if config_path:
+            with open(config_path, "r", encoding='utf-8') as f:
+                self.base_prompt = f.read().strip()
+
+        desc_path = files.get("animations.txt")
+        if desc_path:
+            try:
+                with open(desc_path, "r", encoding='utf-8') as f:
+                    for line in f:
+                        if ":" in line:
+                            key, val = line.split(":", 1)
+                            desc, words = split_keywords(val.strip())
+                            self.descriptions[key.strip().lower()] = desc
+                            if words:
+                                self.keywords[key.strip().lower()] = words
+            except Exception: pass
+
+        # Keep the on-disk spelling for the prompt; look-ups go through the lowercase key
+        self.animation_names = sorted(
+            os.path.splitext(os.path.basename(path))[0]
+            for name, path in files.items() if name.endswith(".mp4")
+        )
+        self.animations = {os.path.splitext(name)[0]: path for name, path in files.items() if name.endswith(".mp4")}
+        self.system_prompt = f"{self.base_prompt}\n\n{self.render_animation_prompt()}"
+        self.hybrid_system_prompt = f"{self.base_prompt}\n\n{self.render_animation_prompt(override_only=True)}"
+        self.local_system_prompt = self.base_prompt
+        self.selector = AnimationSelector(self.animation_names, self.descriptions, self.keywords)
+
+    def render_animation_prompt(self, override_only=False):
+        if not self.animation_names: return ""
+        if override_only:
+            # Every tool call costs a round-trip; here the reply text already picks a fitting clip
+            prompt = ("AVAILABLE ANIMATIONS (chosen automatically from your reply; only call 'set_animation' "
+                      "when the user asks for a specific one):\n")
+        else:
+            prompt = "AVAILABLE ANIMATIONS (Use 'set_animation' tool):\n"
+        for video in self.animation_names:
+            desc = self.descriptions.get(video.lower(), "General purpose animation.")
+            prompt += f"- '{video}': {desc}\n"
+        return prompt
+
+    def animation_path(self, anim_name):
+        if not anim_name: return None
+        return self.animations.get(anim_name.strip().lower())
+
+    def prompt_for(self, tools, override_only=False):
+        # Only mention set_animation to a model that was actually given the tool
+        names = {tool.__name__ for tool in tools}
+        if "set_animation" not in names:
+            return self.local_system_prompt
+        return self.hybrid_system_prompt if override_only else self.system_prompt
+
+    def choose_animation(self, response_text, tool_animation=None, allow_local=True):
+        """Clip to play for a reply: the model's set_animation choice if it exists, else a local pick, else default."""
+        anim_name = tool_animation
+        if not self.animation_path(anim_name) and allow_local:
+            anim_name, _ = self.selector.select(response_text)
+        return anim_name if self.animation_path(anim_name) else "default"
+
+    def clip_library(self, threshold=0.5):
+        # A changed folder gets a new record, so the library is never stale
+        if self.clips is None or self.clips.threshold != threshold:
+            self.clips = ClipLibrary(self.char_dir, threshold)
+        return self.clips
+
+class CharacterRegistry:
+    """
+    In-memory index of the Characters folder.
+    refresh() re-reads only folders whose mtimes changed, so it is cheap to call from a file watcher.
+    """
+
+    WATCHED_FILES = ("config.txt", "animations.txt")
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.records = {}
+
+    def names(self):
+        return sorted(self.records)
+
+    def get(self, name):
+        return self.records.get(name)
+
+    def refresh(self):
+        """Brings the index up to date. Returns the names whose records were added, rebuilt or removed."""
+        if not os.path.exists(self.base_path):
+            try: os.makedirs(self.base_path)
+            except OSError: return []
+
+        changed = []
+        seen = set()
+        with os.scandir(self.base_path) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                seen.add(entry.name)
+                signature = self.signature(entry)
+                record = self.records.get(entry.name)
+                if record and record.signature == signature:
+                    continue
+                try:
+                    self.records[entry.name] = CharacterRecord(entry.name, entry.path, signature)
+                    changed.append(entry.name)
+                except OSError as e:
+                    print(f"Could not index character {entry.name}: {e}")
+
+        for name in list(self.records):
+            if name not in seen:
+                del self.records[name]
+                changed.append(name)
+        return changed
+
+    def signature(self, entry):
+        # Adding/removing clips bumps the folder mtime; edits to the text files only bump their own
+        stamps = [entry.stat().st_mtime_ns]
+        for filename in self.WATCHED_FILES:
+            try:
+                stamps.append(os.stat(os.path.join(entry.path, filename)).st_mtime_ns)
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def watch_paths(self):
+        """Folders and files a file watcher should observe to keep this registry current."""
+        paths = [self.base_path]
+        for record in self.records.values():
+            paths.append(record.char_dir)
+            for filename in self.WATCHED_FILES:
+                path = os.path.join(record.char_dir, filename)
+                if os.path.exists(path):
+                    paths.append(path)
+        return paths
@@ -0,0 +1,152 @@
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.TextIndex import TfidfIndex
+
+def clip_slug(text):
+    """Filesystem-safe clip name made from a line of text."""
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")[:40] or "clip"
+
+def copy_clip(video_path, target):
+    # Copy out of the Veo cache, which may evict the clip later; the rename keeps half-written files invisible
+    shutil.copyfile(video_path, target + ".tmp")
+    os.replace(target + ".tmp", target)
+
+class ClipLibrary:
+    """
+    Pre-rendered Veo clips for one character, stored in <character>/clip_library with an index.json.
+    Replies are matched against each clip's intent line with TF-IDF, so a close clip plays instantly
+    and live generation is only needed when nothing is similar enough.
+    (Intents are indexed rather than full Veo prompts, whose shared boilerplate would swamp the scores.)
+    """
+
+    # Used when the character folder has no intents.txt (one reply-style line per intent)
+    DEFAULT_INTENTS = [
+        "Hello there, welcome! It is good to see you.",
+        "Goodbye, farewell and take care.",
+        "Let me think about that for a moment.",
+        "Here is the answer you were looking for.",
+        "I am sorry, I cannot help with that.",
+        "That is wonderful news, congratulations!",
+        "Let me do that for you right away.",
+        "Thank you, you are very kind.",
+        "Hmm, I am not sure I understand.",
+        "Let me tell you a little about myself.",
+    ]
+
+    def __init__(self, char_dir, threshold=0.5):
+        self.char_dir = char_dir
+        self.dir = os.path.join(char_dir, "clip_library")
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.threshold = threshold
+        self.entries = []  # {"intent", "prompt", "file"}
+        self.index = TfidfIndex()
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = []
+        except Exception as e:
+            print(f"Could not read clip library index {self.index_path}: {e}")
+            self.entries = []
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        self.index = TfidfIndex()
+        for i, entry in enumerate(self.entries):
+            self.index.add(i, entry["intent"])
+        self.index.build()
+
+    def save(self):
+        os.makedirs(self.dir, exist_ok=True)
+        with open(self.index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def load_intents(self):
+        path = os.path.join(self.char_dir, "intents.txt")
+        if not os.path.exists(path):
+            return list(self.DEFAULT_INTENTS)
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def match(self, reply_text):
+        """Returns (clip path, similarity) for the closest clip, or (None, similarity) if none passes the threshold."""
+        if not self.entries:
+            return None, 0.0
+        hits = self.index.query(reply_text, k=1)
+        if not hits:
+            return None, 0.0
+        doc_id, score = hits[0]
+        if score < self.threshold:
+            return None, score
+        path = os.path.join(self.dir, self.entries[doc_id]["file"])
+        return (path, score) if os.path.exists(path) else (None, score)
+
+    def pregenerate(self, model, idle_path, character, prompt_builder, intents=None, workers=2):
+        """
+        Generates a clip for every intent that is not in the library yet, using model.generate_veo_video.
+        prompt_builder turns an intent line into the Veo prompt, exactly as live replies are turned into prompts.
+        """
+        intents = intents or self.load_intents()
+        done = {entry["intent"] for entry in self.entries}
+        todo = [intent for intent in intents if intent not in done]
+        print(f"Pre-rendering {len(todo)} clip(s) for {character}...")
+
+        def render(intent):
+            prompt = prompt_builder(intent)
+            video_path, error = model.generate_veo_video(prompt, idle_path, character)
+            if not video_path:
+                print(f"  Failed '{intent}': {error}")
+                return
+            filename = f"{clip_slug(intent)}.mp4"
+            os.makedirs(self.dir, exist_ok=True)
+            copy_clip(video_path, os.path.join(self.dir, filename))
+            with self.lock:
+                self.entries.append({"intent": intent, "prompt": prompt, "file": filename})
+                self.save() # Save after every clip so an interrupted run keeps its progress
+            print(f"  Rendered '{intent}' -> {filename}")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(render, todo))
+        self.rebuild_index()
+
+def main():
+    # Usage: python -m src.ClipLibrary <Character> [intents file]
+    from dotenv import load_dotenv
+    from src.Model import AIModel
+    from src.VeoScheduler import construct_veo_prompt
+    from src.CharacterRegistry import CharacterRegistry
+
+    load_dotenv()
+    if len(sys.argv) < 2:
+        print("Usage: python -m src.ClipLibrary <Character> [intents file]")
+        sys.exit(1)
+
+    registry = CharacterRegistry(os.path.join(os.getcwd(), "Characters"))
+    registry.refresh()
+    record = registry.get(sys.argv[1])
+    if not record or not record.idle_path:
+        print(f"Character '{sys.argv[1]}' not found or has no idle.png.")
+        sys.exit(1)
+
+    intents = None
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "r", encoding="utf-8") as f:
+            intents = [line.strip() for line in f if line.strip()]
+
+    model = AIModel(api_key=os.getenv("GEMINI_API_KEY"), veo_api_key=os.getenv("VEO_API_KEY"),
+                    system_instruction=record.system_prompt)
+    library = ClipLibrary(record.char_dir)
+    library.pregenerate(model, record.idle_path, record.name, construct_veo_prompt, intents)
+
+if __name__ == "__main__":
+    main()
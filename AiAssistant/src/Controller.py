@@ -1,54 +1,88 @@
 import os
-import glob
 import re # For extracting action text
-from PyQt6.QtCore import QThread, pyqtSignal
+import threading
+from PyQt6.QtCore import QFileSystemWatcher, QObject, QThread, pyqtSignal
 from PyQt6.QtMultimedia import QMediaPlayer
-from src.Tools import ToolKit 
+from src.Tools import ToolKit, begin_animation_choice
+from src.VeoScheduler import VeoScheduler, construct_veo_prompt, veo_prompt_settled
+from src.RequestQueue import ChatRequest, RequestQueue
+from src.CharacterRegistry import CharacterRegistry
+from src.Tracing import tracer
 
 class WorkerThread(QThread):
-    chat_finished = pyqtSignal(str) # Emits text response
-    video_ready = pyqtSignal(str)   # Emits path to generated video
+    """Long-lived worker: pulls requests off the shared RequestQueue until it is closed."""
+    chat_chunk = pyqtSignal(int, str)    # Emits request id + each piece of a streamed response
+    chat_finished = pyqtSignal(int, str, str, list) # Emits request id + text response + animation picked by set_animation + ids merged into it
+    video_requested = pyqtSignal(int, str, str, str) # Emits request id + Veo prompt + reply text so far + character, usually before chat_finished
+    queue_depth = pyqtSignal(int)        # Emits how many requests are still waiting
     
-    def __init__(self, model, user_input, use_veo, idle_image_path):
+    def __init__(self, model, queue):
         super().__init__()
         self.model = model
-        self.user_input = user_input
-        self.use_veo = use_veo
-        self.idle_path = idle_image_path
+        self.queue = queue
 
     def run(self):
-        # 1. Get Text Response
-        response_text = self.model.chat(self.user_input)
-        self.chat_finished.emit(response_text)
-        
-        # 2. If Veo is enabled, generate video
-        if self.use_veo and self.idle_path:
-            # Parse prompt: Use action if found, else dialogue
-            veo_prompt = self.construct_veo_prompt(response_text)
-            
-            video_path, error = self.model.generate_veo_video(veo_prompt, self.idle_path)
-            
-            if video_path:
-                self.video_ready.emit(video_path)
-            else:
-                print(error) # Print error to console
+        while True:
+            request = self.queue.take()
+            if request is None:
+                return # Queue closed, app is shutting down
+            self.queue_depth.emit(self.queue.depth())
+            try:
+                # Spans started while handling this request carry its character and id
+                with tracer.context(character=request.character, request_id=request.request_id):
+                    self.handle_request(request)
+            except Exception as e:
+                print(f"Worker error: {e}")
+            finally:
+                self.queue.done(request)
 
-    def construct_veo_prompt(self, text):
-        """
-        Use the first sentence as Dialogue. add in relevant details if the character says they are doing something.
-        """
-        # Look for text between asterisks e.g. *waves hand*
-        #actions = re.findall(r'\*(.*?)\*', text)
+    def handle_request(self, request):
+        # Fresh tool state for this request only
+        choice = begin_animation_choice()
+
+        # 1. Get Text Response (streamed pieces go to the view as they arrive).
+        # Veo requests always stream from the model so the clip can start before the reply is complete
+        video_sent = False
+        if request.stream or request.use_veo:
+            text_so_far = ""
+            for chunk in self.model.chat_stream(request.text, handle=request.handle):
+                text_so_far += chunk
+                if request.stream:
+                    self.chat_chunk.emit(request.request_id, chunk)
+                # 2. Once the first sentence is settled the Veo prompt cannot change; start the clip now
+                # while the rest of the reply and its tool calls finish
+                if request.use_veo and not video_sent and veo_prompt_settled(text_so_far):
+                    self.request_video(request, text_so_far)
+                    video_sent = True
+            response_text = text_so_far or "(Action executed)"
+        else:
+            response_text = self.model.chat(request.text, handle=request.handle)
+        self.chat_finished.emit(request.request_id, response_text, choice.name or "", request.merged_ids)
         
-        #if actions:
-            # Use the first action found
-            #action_desc = actions[0]
-            #return f"Cinematic shot. The character performs this action: {action_desc}. High quality, 4k, fluid motion."
-        #else:
-            # Use the first sentence for dialogue lip-sync style context
-        first_sentence = text.split('.')[0]
-        if len(first_sentence) > 100: first_sentence = first_sentence[:100]
-        return f"Cinematic shot. The character is speaking conversationally. Context: {first_sentence}. Maintain eye contact, subtle movement."
+        # Short replies with no sentence boundary go to the scheduler once complete
+        if request.use_veo and not video_sent:
+            self.request_video(request, response_text)
+
+    def request_video(self, request, reply_text):
+        # Hand the prompt to the scheduler (this thread does not wait for the video)
+        with tracer.span("veo_kickoff", chars=len(reply_text)):
+            veo_prompt = self.construct_veo_prompt(reply_text)
+            self.video_requested.emit(request.request_id, veo_prompt, reply_text, request.character)
+
+    @staticmethod
+    def construct_veo_prompt(text):
+        # Lives in VeoScheduler so the headless server can build prompts without Qt
+        return construct_veo_prompt(text)
+
+class VeoBridge(QObject):
+    # Carries finished Veo jobs from the scheduler thread back to the GUI thread
+    video_ready = pyqtSignal(int, str, str)   # request id, path to generated video, character
+    video_partial = pyqtSignal(int, str, str) # request id, path to a clip that is still downloading but playable, character
+
+class ModelLoader(QObject):
+    # Carries the model built on the loader thread back to the GUI thread
+    ready = pyqtSignal(object)
+    failed = pyqtSignal(str)
 
 class AppController:
     def __init__(self):
@@ -56,13 +90,41 @@ class AppController:
         self.model = None
         self.current_char = "CyberBot" 
         self.char_base_path = os.path.join(os.getcwd(), "Characters")
-        self.worker = None
+        self.registry = CharacterRegistry(self.char_base_path)
+        self.clip_match_threshold = 0.5
+        # "tool": model picks clips via set_animation; "hybrid": local selector, the prompt offers set_animation
+        # only as an override; "local": set_animation is removed from the model's tools entirely
+        self.animation_mode = "hybrid"
+        self.watcher = None
+        self.workers = []
+        self.worker_count = 2 # Parallelism across lanes; one chat session is never used by two workers at once
+        self.request_queue = RequestQueue()
+        self.unbound_requests = [] # Typed before the model finished loading; queued once it has sessions to bind to
+        self.stream_replies = True
+        self.submit_spans = {} # request id -> "user_submit" span, ended when the reply is complete
+        self.request_id = 0 # Increments per message; only the newest reply's clip is played
+        self.veo_scheduler = None
+        self.veo_bridge = VeoBridge()
+        self.veo_bridge.video_ready.connect(self.handle_generated_video)
+        self.veo_bridge.video_partial.connect(self.handle_partial_video)
+        self.progressive_request = None # Request whose clip started playing before its download finished
+        self.model_loader = ModelLoader()
+        self.model_loader.ready.connect(self.set_model)
+        self.model_loader.failed.connect(self.on_model_failed)
+        self.veo_sdk_requested = False
 
     def set_view(self, view):
         self.view = view
-        self.view.media_player.mediaStatusChanged.connect(self.on_media_status_changed)
+        self.view.media_status_changed.connect(self.on_media_status_changed)
         
         chars = self.scan_characters()
+
+        # Keep the registry current without touching disk on every switch / clip end
+        self.watcher = QFileSystemWatcher()
+        self.watcher.directoryChanged.connect(self.on_character_files_changed)
+        self.watcher.fileChanged.connect(self.on_character_files_changed)
+        self.update_watched_paths()
+
         self.view.populate_char_selector(chars)
         
         if self.current_char in chars:
@@ -74,17 +136,113 @@ class AppController:
         self.load_character_data()
 
     def scan_characters(self):
-        if not os.path.exists(self.char_base_path):
-            try: os.makedirs(self.char_base_path)
-            except OSError: return []
-        character_list = [
-            name for name in os.listdir(self.char_base_path)
-            if os.path.isdir(os.path.join(self.char_base_path, name))
-        ]
-        return sorted(character_list)
+        self.registry.refresh()
+        return self.registry.names()
+
+    def update_watched_paths(self):
+        watched = set(self.watcher.files() + self.watcher.directories())
+        wanted = set(self.registry.watch_paths())
+        if watched - wanted:
+            self.watcher.removePaths(list(watched - wanted))
+        if wanted - watched:
+            self.watcher.addPaths(list(wanted - watched))
+
+    def on_character_files_changed(self, path):
+        old_prompt = self.current_record().system_prompt if self.current_record() else None
+        old_local_prompt = self.current_record().local_system_prompt if self.current_record() else None
+        old_idle_paths = {name: record.idle_path for name, record in self.registry.records.items()}
+        changed = self.registry.refresh()
+        if not changed:
+            return
+        for name in changed:
+            if old_idle_paths.get(name):
+                self.view.forget_image(old_idle_paths[name]) # idle.png may have been replaced
+        self.update_watched_paths()
+
+        # Folders added or removed: rebuild the selector without firing change_character
+        chars = self.registry.names()
+        if self.view.char_selector.count() != len(chars) or any(name not in chars for name in changed):
+            self.view.char_selector.blockSignals(True)
+            self.view.populate_char_selector(chars)
+            self.view.set_current_char(self.current_char)
+            self.view.char_selector.blockSignals(False)
+
+        # Only rebuild the chat if the current character's prompt actually changed
+        record = self.current_record()
+        if self.current_char in changed and record and (record.system_prompt, record.local_system_prompt) != (old_prompt, old_local_prompt):
+            self.load_character_data()
+
+    def current_record(self):
+        return self.registry.get(self.current_char)
+
+    def load_model_async(self, factory):
+        """
+        Builds the model on a background thread so the window can show first.
+        Messages sent before it is ready wait in the request queue.
+        """
+        def build():
+            try:
+                with tracer.span("model_construct"):
+                    model = factory()
+            except Exception as e:
+                self.model_loader.failed.emit(str(e))
+                return
+            self.model_loader.ready.emit(model)
+
+        threading.Thread(target=build, name="ModelLoader", daemon=True).start()
+
+    def on_model_failed(self, error):
+        print(f"Could not start the chat model: {error}")
+        if self.view:
+            self.view.update_chat(f"Error: could not start the chat model: {error}")
 
     def set_model(self, model):
         self.model = model
+        if self.animation_mode == "local":
+            model.set_tools(ToolKit.local_animation_tools_list)
+        self.veo_scheduler = VeoScheduler(model)
+        self.apply_character_prompt()
+        self.start_workers()
+        for request in self.unbound_requests:
+            self.queue_request(request)
+        self.unbound_requests = []
+        if self.veo_sdk_requested:
+            self.warm_veo_sdk()
+
+    def on_veo_toggled(self, checked):
+        # First time Veo is switched on, import its SDK in the background so the first job does not pay for it
+        if checked and not self.veo_sdk_requested:
+            self.veo_sdk_requested = True
+            if self.model:
+                self.warm_veo_sdk()
+
+    def warm_veo_sdk(self):
+        def load():
+            from src.Model import load_veo_sdk
+            try:
+                load_veo_sdk()
+            except Exception as e:
+                print(f"Could not import the Veo SDK: {e}")
+        threading.Thread(target=load, name="VeoImport", daemon=True).start()
+
+    def start_workers(self):
+        for _ in range(self.worker_count):
+            worker = WorkerThread(self.model, self.request_queue)
+            worker.chat_chunk.connect(self.handle_text_chunk)
+            worker.chat_finished.connect(self.handle_text_response)
+            worker.video_requested.connect(self.handle_video_request)
+            worker.queue_depth.connect(self.handle_queue_depth)
+            worker.start()
+            self.workers.append(worker)
+
+    def shutdown(self):
+        self.request_queue.close()
+        for worker in self.workers:
+            worker.wait()
+        if self.veo_scheduler:
+            self.veo_scheduler.shutdown()
+        if self.model:
+            self.model.close()
 
     def change_character(self, char_name):
         if not char_name: return
@@ -92,93 +250,136 @@ class AppController:
         self.load_character_data()
 
     def load_character_data(self):
-        char_dir = os.path.join(self.char_base_path, self.current_char)
-        
-        idle_path = os.path.join(char_dir, "idle.png")
-        if os.path.exists(idle_path):
-            self.view.set_idle_image(idle_path)
-        
-        base_prompt = "You are a helpful assistant."
-        config_path = os.path.join(char_dir, "config.txt")
-        if os.path.exists(config_path):
-            with open(config_path, "r", encoding='utf-8') as f:
-                base_prompt = f.read().strip()
-
-        anim_prompt = self.generate_animation_prompt(char_dir)
-        final_system_prompt = f"{base_prompt}\n\n{anim_prompt}"
+        record = self.current_record()
+        if not record:
+            return
+
+        if record.idle_path:
+            self.view.set_idle_image(record.idle_path)
+
+        # Warm players with the clips this character is most likely to play next
+        likely = [record.animation_path("default")] + [record.animations[name] for name in sorted(record.animations) if name != "default"]
+        self.view.preload_videos([path for path in likely if path])
         
-        if self.model:
-            self.model.update_system_instruction(final_system_prompt)
+        self.apply_character_prompt()
 
-    def generate_animation_prompt(self, char_dir):
-        # (Same as before)
-        mp4_files = glob.glob(os.path.join(char_dir, "*.mp4"))
-        available_videos = [os.path.splitext(os.path.basename(f))[0] for f in mp4_files]
-        if not available_videos: return ""
+    def apply_character_prompt(self):
+        record = self.current_record()
+        if self.model and record:
+            self.model.update_system_instruction(self.character_prompt(record), record.name)
 
-        descriptions = {}
-        desc_path = os.path.join(char_dir, "animations.txt")
-        if os.path.exists(desc_path):
-            try:
-                with open(desc_path, "r", encoding='utf-8') as f:
-                    for line in f:
-                        if ":" in line:
-                            key, val = line.split(":", 1)
-                            descriptions[key.strip().lower()] = val.strip()
-            except Exception: pass
-
-        prompt = "AVAILABLE ANIMATIONS (Use 'set_animation' tool):\n"
-        for video in available_videos:
-            desc = descriptions.get(video.lower(), "General purpose animation.")
-            prompt += f"- '{video}': {desc}\n"
-        return prompt
+    def character_prompt(self, record):
+        # In "local" mode set_model() has removed set_animation from the model's tools
+        return record.prompt_for(self.model.tools, override_only=self.animation_mode == "hybrid")
 
     def handle_user_input(self, text, use_veo=False):
-        # Reset tool state
-        ToolKit.selected_animation = None 
-        
-        # Get current idle image path for Veo
-        char_dir = os.path.join(self.char_base_path, self.current_char)
-        idle_path = os.path.join(char_dir, "idle.png")
-
-        # Start Worker
-        self.worker = WorkerThread(self.model, text, use_veo, idle_path)
-        self.worker.chat_finished.connect(self.handle_text_response)
-        self.worker.video_ready.connect(self.handle_generated_video)
-        self.worker.start()
-
-    def handle_text_response(self, response):
-        self.view.update_chat(response)
+        # A new message makes any clip still generating for an older reply stale
+        self.request_id += 1
+        if self.veo_scheduler:
+            self.veo_scheduler.supersede(self.request_id)
+
+        self.submit_spans[self.request_id] = tracer.start("user_submit", character=self.current_char,
+                                                          request_id=self.request_id, use_veo=use_veo)
+
+        request = ChatRequest(self.request_id, text, use_veo, self.stream_replies, character=self.current_char)
+        self.queue_request(request)
+
+    def queue_request(self, request):
+        if not self.model:
+            self.unbound_requests.append(request)
+            self.handle_queue_depth(len(self.unbound_requests))
+            return
+        # Bind the session now: the user may switch characters before a worker picks this up.
+        # The chat session is the lane so its turns stay in order
+        record = self.registry.get(request.character)
+        prompt = self.character_prompt(record) if record else None
+        request.bind(self.model.open_session(prompt, request.character))
+        depth = self.request_queue.put(request)
+        self.handle_queue_depth(depth)
+
+    def handle_queue_depth(self, depth):
+        self.view.set_queue_depth(depth)
+
+    def handle_text_chunk(self, request_id, chunk):
+        self.view.append_chat_chunk(request_id, chunk)
+
+    def handle_text_response(self, request_id, response, animation="", merged_ids=()):
+        # Requests coalesced into this one finish with it; other lanes' requests are still pending
+        for pending_id in list(merged_ids) + [request_id]:
+            span = self.submit_spans.pop(pending_id, None)
+            if span:
+                span.end(coalesced=pending_id != request_id)
+
+        self.view.update_chat(response, request_id)
         
         # If Veo is NOT enabled, run the standard animation logic immediately
         if not self.view.veo_checkbox.isChecked():
-            self.play_standard_animation()
+            with tracer.context(character=self.current_char, request_id=request_id):
+                self.play_standard_animation(response, animation)
+
+    def handle_video_request(self, request_id, veo_prompt, reply_text, character):
+        # The clip belongs to the character the message was sent to, not whoever is selected now
+        if character != self.current_char:
+            return # User switched away; the clip would never be shown
+        record = self.registry.get(character)
+        if not record or not record.idle_path:
+            print(f"No idle.png for {character}; skipping Veo generation.")
+            return
+
+        # A close enough pre-rendered clip plays straight away; only generate live when none matches.
+        # reply_text is usually just the first sentence, since the worker kicks Veo off mid-stream
+        clip_path, score = record.clip_library(self.clip_match_threshold).match(reply_text)
+        if clip_path:
+            print(f"Using pre-rendered clip ({score:.2f}): {clip_path}")
+            self.handle_generated_video(request_id, clip_path, character)
+            return
+
+        self.veo_scheduler.submit(veo_prompt, record.idle_path, character, request_id,
+                                  self.on_veo_job_done, self.on_veo_job_ready)
+
+    def on_veo_job_ready(self, job, partial_path):
+        # Runs on the scheduler's download thread once the head of the clip is on disk
+        self.veo_bridge.video_partial.emit(job.request_id, partial_path, job.character)
 
-    def handle_generated_video(self, video_path):
+    def on_veo_job_done(self, job):
+        # Runs on the scheduler thread; the bridge signal hops back to the GUI thread
+        if job.result_path:
+            self.veo_bridge.video_ready.emit(job.request_id, job.result_path, job.character)
+        else:
+            print(job.error) # Print error to console
+
+    def handle_generated_video(self, request_id, video_path, character):
         # This is called when Veo finishes (could be 10-20 seconds later)
-        self.view.play_video(video_path)
+        if request_id != self.request_id or character != self.current_char:
+            return # User has moved on; an old clip would not match the current reply or character
+        if self.progressive_request == request_id and self.view.is_video_playing():
+            return # Already playing from the partial download
+        with tracer.context(character=self.current_char, request_id=request_id):
+            self.view.play_video(video_path)
+
+    def handle_partial_video(self, request_id, partial_path, character):
+        if request_id != self.request_id or character != self.current_char:
+            return
+        self.progressive_request = request_id
+        with tracer.context(character=self.current_char, request_id=request_id, progressive=True):
+            self.view.play_video(partial_path)
 
-    def play_standard_animation(self):
+    def play_standard_animation(self, response_text="", tool_animation=None):
         """The original logic for playing pre-canned MP4s"""
-        char_dir = os.path.join(self.char_base_path, self.current_char)
-        anim_name = ToolKit.selected_animation
-        video_path = None
-
-        if anim_name:
-            potential_path = os.path.join(char_dir, f"{anim_name}.mp4")
-            if os.path.exists(potential_path):
-                video_path = potential_path
-
-        if not video_path:
-            default_path = os.path.join(char_dir, "default.mp4")
-            if os.path.exists(default_path):
-                video_path = default_path
-            
+        record = self.current_record()
+        if not record:
+            return
+
+        # Tool choice wins when the model made one; otherwise pick locally from the reply text.
+        # Registry already knows which clips exist, so no disk checks here
+        anim_name = record.choose_animation(response_text, tool_animation, allow_local=self.animation_mode != "tool")
+        video_path = record.animation_path(anim_name)
+
         if video_path:
             self.view.play_video(video_path)
 
     def on_media_status_changed(self, status):
-        if status == QMediaPlayer.MediaStatus.EndOfMedia:
-            char_dir = os.path.join(self.char_base_path, self.current_char)
-            idle_path = os.path.join(char_dir, "idle.png")
-            self.view.set_idle_image(idle_path)
\ No newline at end of file
+        if status in (QMediaPlayer.MediaStatus.EndOfMedia, QMediaPlayer.MediaStatus.InvalidMedia):
+            record = self.current_record()
+            if record and record.idle_path:
+                self.view.set_idle_image(record.idle_path)
\ No newline at end of file
@@ -0,0 +1,204 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+class ConversationStore:
+    """
+    Persistent chat history: one append-only JSON-lines log per character plus a SQLite index of
+    (character, byte offset, length) per entry, with full-text search over the message text.
+
+    Resuming reads only the index rows for the last N entries and seeks straight to them in the log,
+    so it costs the same whether a character has ten turns on disk or ten thousand.
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        os.makedirs(base_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(base_dir, "index.sqlite"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS entries (
+            id INTEGER PRIMARY KEY, character TEXT, session TEXT, kind TEXT, role TEXT,
+            ts REAL, offset INTEGER, length INTEGER, live_from INTEGER)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_by_character ON entries (character, id)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_by_kind ON entries (character, kind, id)")
+
+        # Not every SQLite build has FTS5; search() falls back to LIKE without it
+        try:
+            self.db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(text, content='')")
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.db.execute("CREATE TABLE IF NOT EXISTS entries_text (id INTEGER PRIMARY KEY, text TEXT)")
+            self.fts = False
+        self.db.commit()
+
+        self.catch_up()
+
+    def log_path(self, character):
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", character)
+        return os.path.join(self.base_dir, f"{safe}.log")
+
+    @staticmethod
+    def entry_text(content):
+        return " ".join(part["text"] for part in content.get("parts", []) if part.get("text"))
+
+    def append(self, character, session, contents):
+        """Appends new history entries (Content dicts) to the character's log and indexes them."""
+        self.write(character, session, contents, "turn")
+
+    def append_summary(self, character, session, contents, kept):
+        """
+        Records a folded history: contents is the summary exchange that now replaces everything
+        except the last `kept` logged entries.
+        """
+        self.write(character, session, contents, "summary", kept)
+
+    def write(self, character, session, contents, kind, kept=0):
+        if not contents:
+            return
+        now = time.time()
+        with self.lock:
+            live_from = None
+            if kind == "summary":
+                row = self.db.execute(
+                    "SELECT id FROM entries WHERE character = ? AND kind = 'turn' ORDER BY id DESC LIMIT 1 OFFSET ?",
+                    (character, max(0, kept - 1))).fetchone() if kept else None
+                live_from = row[0] if row else self.last_id() + 1
+
+            # 1. Log first, so the index never points past the end of the file
+            rows = []
+            with open(self.log_path(character), "ab") as f:
+                for content in contents:
+                    record = {"ts": now, "session": session, "kind": kind, "content": content, "live_from": live_from}
+                    line = json.dumps(record).encode("utf-8") + b"\n"
+                    rows.append((content, f.tell(), len(line)))
+                    f.write(line)
+            # 2. Then the index
+            for content, offset, length in rows:
+                self.index_entry(character, session, kind, content, now, offset, length, live_from)
+            self.db.commit()
+
+    def last_id(self):
+        return self.db.execute("SELECT COALESCE(MAX(id), 0) FROM entries").fetchone()[0]
+
+    def index_entry(self, character, session, kind, content, ts, offset, length, live_from=None):
+        cursor = self.db.execute(
+            "INSERT INTO entries (character, session, kind, role, ts, offset, length, live_from) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (character, session, kind, content.get("role"), ts, offset, length, live_from))
+        text = self.entry_text(content)
+        if text:
+            table = "entries_fts (rowid, text)" if self.fts else "entries_text (id, text)"
+            self.db.execute(f"INSERT INTO {table} VALUES (?, ?)", (cursor.lastrowid, text))
+
+    def catch_up(self):
+        """Indexes log lines written after the last indexed entry (crash between log and index, or a deleted index)."""
+        with self.lock:
+            for name in os.listdir(self.base_dir):
+                if not name.endswith(".log"):
+                    continue
+                path = os.path.join(self.base_dir, name)
+                indexed_end, character = self.indexed_end(path)
+                if indexed_end >= os.path.getsize(path):
+                    continue
+                with open(path, "rb") as f:
+                    f.seek(indexed_end)
+                    offset = indexed_end
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break # Torn final write
+                        try:
+                            record = json.loads(line)
+                            self.index_entry(character or name[:-4], record["session"], record["kind"], record["content"],
+                                             record["ts"], offset, len(line), record.get("live_from"))
+                        except (ValueError, KeyError) as e:
+                            print(f"Skipping unreadable history entry in {name}: {e}")
+                        offset += len(line)
+            self.db.commit()
+
+    def indexed_end(self, path):
+        for (character,) in self.db.execute("SELECT DISTINCT character FROM entries"):
+            if self.log_path(character) == path:
+                row = self.db.execute("SELECT offset + length FROM entries WHERE character = ? ORDER BY id DESC LIMIT 1",
+                                      (character,)).fetchone()
+                return row[0], character
+        return 0, None
+
+    def read(self, character, rows):
+        """Reads the logged Content dicts for (offset, length) index rows."""
+        contents = []
+        if not rows:
+            return contents
+        try:
+            with open(self.log_path(character), "rb") as f:
+                for offset, length in rows:
+                    f.seek(offset)
+                    contents.append(json.loads(f.read(length))["content"])
+        except (OSError, ValueError) as e:
+            print(f"Could not read chat history for {character}: {e}")
+            return []
+        return contents
+
+    def resume(self, character, max_entries=40):
+        """
+        History to start a chat session with: the latest summary (if any) followed by at most
+        max_entries of the entries it did not fold away, starting on a user message.
+        """
+        with self.lock:
+            # 1. Latest summary exchange (all rows written by one append_summary share its timestamp)
+            summary = self.db.execute(
+                "SELECT ts, live_from FROM entries WHERE character = ? AND kind = 'summary' ORDER BY id DESC LIMIT 1",
+                (character,)).fetchone()
+            summary_rows, live_from = [], 0
+            if summary:
+                summary_rows = self.db.execute(
+                    "SELECT offset, length FROM entries WHERE character = ? AND kind = 'summary' AND ts = ? ORDER BY id",
+                    (character, summary[0])).fetchall()
+                live_from = summary[1] or 0
+            # 2. The newest entries it did not fold away
+            tail = self.db.execute(
+                "SELECT offset, length, role FROM entries WHERE character = ? AND kind = 'turn' AND id >= ? "
+                "ORDER BY id DESC LIMIT ?", (character, live_from, max_entries)).fetchall()
+        tail.reverse()
+
+        contents = self.read(character, summary_rows + [(offset, length) for offset, length, _ in tail])
+        head, turns = contents[:len(summary_rows)], contents[len(summary_rows):]
+        # Never start in the middle of a function call/response exchange
+        while turns and not (turns[0].get("role") == "user" and self.entry_text(turns[0])):
+            turns.pop(0)
+        return head + turns
+
+    def search(self, query, character=None, limit=20):
+        """Past messages matching query, newest first, as dicts with character, role, ts and text."""
+        with self.lock:
+            if self.fts:
+                terms = " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+                if not terms:
+                    return []
+                sql = ("SELECT e.character, e.role, e.ts, e.offset, e.length FROM entries_fts f "
+                       "JOIN entries e ON e.id = f.rowid WHERE entries_fts MATCH ?")
+                params = [terms]
+            else:
+                sql = ("SELECT e.character, e.role, e.ts, e.offset, e.length FROM entries_text t "
+                       "JOIN entries e ON e.id = t.id WHERE t.text LIKE ?")
+                params = [f"%{query}%"]
+            if character:
+                sql += " AND e.character = ?"
+                params.append(character)
+            sql += " ORDER BY e.id DESC LIMIT ?"
+            params.append(limit)
+            rows = self.db.execute(sql, params).fetchall()
+
+        results = []
+        for char, role, ts, offset, length in rows:
+            content = self.read(char, [(offset, length)])
+            if content:
+                results.append({"character": char, "role": role, "ts": ts, "text": self.entry_text(content[0])})
+        return results
+
+    def close(self):
+        with self.lock:
+            self.db.close()
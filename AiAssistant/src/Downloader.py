@@ -0,0 +1,97 @@
+import base64
+import hashlib
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+class DownloadError(Exception):
+    pass
+
+class VideoDownloader:
+    """
+    Streams clips to disk in chunks over one pooled HTTP session.
+    Dropped connections resume with a Range request, and the file is checked against the server's MD5 when it sends one.
+    """
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, chunk_size=256 * 1024, retries=3, ready_bytes=1024 * 1024, pool_size=4):
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.ready_bytes = ready_bytes # Bytes on disk before on_ready fires and playback may start
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def download(self, url, dest_path, on_ready=None, headers=None):
+        """
+        Downloads url into dest_path and returns the file's SHA-256.
+        on_ready(dest_path) is called once, as soon as ready_bytes have been written (or at the end for small files).
+        """
+        sha256 = hashlib.sha256()
+        md5 = hashlib.md5()
+        written = 0
+        expected_md5 = None
+        ready_sent = False
+
+        for attempt in range(self.retries + 1):
+            request_headers = dict(headers or {})
+            if written:
+                request_headers["Range"] = f"bytes={written}-"
+            try:
+                with self.session.get(url, headers=request_headers, stream=True, timeout=(10, 60)) as resp:
+                    if resp.status_code == 200 and written:
+                        # Server ignored the Range header; start over
+                        written = 0
+                        sha256 = hashlib.sha256()
+                        md5 = hashlib.md5()
+                    elif resp.status_code in self.RETRY_STATUS:
+                        raise requests.ConnectionError(f"HTTP {resp.status_code}")
+                    elif resp.status_code not in (200, 206):
+                        raise DownloadError(f"Download Error {resp.status_code}: {resp.text[:200]}")
+
+                    if resp.status_code == 200:
+                        expected_md5 = self.header_md5(resp.headers)
+                    total = written + int(resp.headers.get("Content-Length", 0) or 0)
+
+                    with open(dest_path, "ab" if written else "wb") as f:
+                        for chunk in resp.iter_content(self.chunk_size):
+                            if not chunk:
+                                continue
+                            f.write(chunk)
+                            sha256.update(chunk)
+                            md5.update(chunk)
+                            written += len(chunk)
+                            if on_ready and not ready_sent and written >= self.ready_bytes:
+                                f.flush()
+                                ready_sent = True
+                                on_ready(dest_path)
+
+                if total and written < total:
+                    raise requests.ConnectionError(f"Connection closed at {written}/{total} bytes")
+                break
+
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == self.retries:
+                    raise DownloadError(f"Download failed after {attempt + 1} attempts: {e}")
+                print(f"Download interrupted ({e}), resuming at {written} bytes...")
+                time.sleep(min(2 ** attempt, 10))
+
+        if expected_md5 and md5.digest() != expected_md5:
+            raise DownloadError("Checksum mismatch: downloaded clip is corrupt.")
+
+        if on_ready and not ready_sent:
+            on_ready(dest_path)
+        return sha256.hexdigest()
+
+    def header_md5(self, headers):
+        # Google storage sends e.g. "x-goog-hash: crc32c=...,md5=<base64>"
+        for item in headers.get("x-goog-hash", "").split(","):
+            name, _, value = item.strip().partition("=")
+            if name == "md5" and value:
+                try:
+                    return base64.b64decode(value)
+                except ValueError:
+                    return None
+        return None
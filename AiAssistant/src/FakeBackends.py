@@ -0,0 +1,229 @@
+"""
+Local stand-ins for google.generativeai (chat) and google.genai (Veo), used by the benchmark.
+They mimic just enough of the SDK surface that AIModel touches, with configurable timing.
+"""
+import hashlib
+import itertools
+import time
+from types import SimpleNamespace
+
+class FakeProfile:
+    """Latency/behaviour knobs for the fakes. All times are in seconds."""
+
+    PRESETS = {
+        "fast":    dict(first_token=0.05, chunk_delay=0.01, chunks=10, tool_every=0, fail_every=0,
+                        veo_start=0.05, veo_generation=1.0, veo_poll=0.01, download_rate=50e6),
+        "default": dict(first_token=0.4, chunk_delay=0.05, chunks=20, tool_every=2, fail_every=0,
+                        veo_start=0.2, veo_generation=3.0, veo_poll=0.05, download_rate=10e6),
+        "tools":   dict(first_token=0.4, chunk_delay=0.05, chunks=20, tool_every=1, fail_every=0,
+                        veo_start=0.2, veo_generation=3.0, veo_poll=0.05, download_rate=10e6),
+        "flaky":   dict(first_token=0.6, chunk_delay=0.08, chunks=20, tool_every=2, fail_every=4,
+                        veo_start=0.5, veo_generation=4.0, veo_poll=0.2, download_rate=2e6),
+    }
+
+    def __init__(self, name="default", **overrides):
+        self.name = name
+        settings = dict(self.PRESETS[name])
+        settings.update(overrides)
+        for key, value in settings.items():
+            setattr(self, key, value)
+
+    def as_dict(self):
+        return {key: value for key, value in vars(self).items()}
+
+# --- Chat (google.generativeai) ------------------------------------------------------------
+
+class FakeFunctionCall:
+    def __init__(self, name="", args=None):
+        self.name = name
+        self.args = args or {}
+
+class FakeFunctionResponse:
+    def __init__(self, name="", response=None):
+        self.name = name
+        self.response = response or {}
+
+class FakePart:
+    def __init__(self, text="", function_call=None, function_response=None):
+        self.text = text
+        self.function_call = function_call or FakeFunctionCall()
+        self.function_response = function_response or FakeFunctionResponse()
+
+class FakeContent:
+    def __init__(self, role="user", parts=None):
+        self.role = role
+        self.parts = parts or []
+
+    @staticmethod
+    def to_dict(content):
+        parts = []
+        for part in content.parts:
+            if part.text:
+                parts.append({"text": part.text})
+            elif part.function_call.name:
+                parts.append({"function_call": {"name": part.function_call.name, "args": dict(part.function_call.args)}})
+            elif part.function_response.name:
+                parts.append({"function_response": {"name": part.function_response.name, "response": part.function_response.response}})
+        return {"role": content.role, "parts": parts}
+
+    @staticmethod
+    def from_any(item):
+        if isinstance(item, FakeContent):
+            return item
+        if isinstance(item, str):
+            return FakeContent("user", [FakePart(text=item)])
+        parts = []
+        for part in item.get("parts", []):
+            if "function_call" in part:
+                parts.append(FakePart(function_call=FakeFunctionCall(**part["function_call"])))
+            elif "function_response" in part:
+                parts.append(FakePart(function_response=FakeFunctionResponse(**part["function_response"])))
+            else:
+                parts.append(FakePart(text=part.get("text", "")))
+        return FakeContent(item.get("role", "user"), parts)
+
+class FakeResponse:
+    """Iterable like a streamed GenerateContentResponse; candidates hold the whole turn once iterated."""
+
+    def __init__(self, parts, profile, stream):
+        self.all_parts = parts
+        self.profile = profile
+        self.stream = stream
+        self.candidates = [SimpleNamespace(content=FakeContent("model", parts))]
+        self.usage_metadata = SimpleNamespace(prompt_token_count=0, candidates_token_count=len(parts))
+
+    def __iter__(self):
+        time.sleep(self.profile.first_token)
+        for i, part in enumerate(self.all_parts):
+            if i:
+                time.sleep(self.profile.chunk_delay)
+            yield SimpleNamespace(candidates=[SimpleNamespace(content=FakeContent("model", [part]))])
+
+class FakeChatSession:
+    def __init__(self, profile, counter, history=None):
+        self.profile = profile
+        self.counter = counter # Shared across sessions so failure/tool profiles are global
+        self.history = history or []
+
+    @property
+    def history(self):
+        return self._history
+
+    @history.setter
+    def history(self, items):
+        self._history = [FakeContent.from_any(item) for item in (items or [])]
+
+    def send_message(self, message, stream=False):
+        content = FakeContent.from_any(message)
+        turn = next(self.counter)
+        if self.profile.fail_every and turn % self.profile.fail_every == 0:
+            time.sleep(self.profile.first_token)
+            raise RuntimeError("503 Service Unavailable (fake)")
+
+        user_text = " ".join(part.text for part in content.parts if part.text)
+        if user_text and self.profile.tool_every and turn % self.profile.tool_every == 0:
+            parts = [FakePart(function_call=FakeFunctionCall("set_animation", {"animation_name": "default"}))]
+        else:
+            # Echo the input in the first sentence so each turn gets its own Veo prompt (and cache key)
+            words = f"Ah, {user_text or 'the spell is cast'}! Greetings, traveller. ".split()
+            filler = "The tower hums quietly as I consider your words".split()
+            while len(words) < self.profile.chunks * 3:
+                words += filler
+            per_chunk = max(1, len(words) // self.profile.chunks)
+            parts = [FakePart(text=" ".join(words[i:i + per_chunk]) + " ") for i in range(0, len(words), per_chunk)]
+
+        response = FakeResponse(parts, self.profile, stream)
+        if not stream:
+            time.sleep(self.profile.first_token + self.profile.chunk_delay * (len(parts) - 1))
+        self._history += [content, FakeContent("model", parts)]
+        return response
+
+class FakeGenerativeModel:
+    def __init__(self, profile, counter, model_name=None, tools=None, system_instruction=None):
+        self.profile = profile
+        self.counter = counter
+        self.system_instruction = system_instruction
+
+    def start_chat(self, history=None, **kwargs):
+        return FakeChatSession(self.profile, self.counter, history)
+
+    def generate_content(self, prompt):
+        time.sleep(self.profile.first_token)
+        return SimpleNamespace(text="Earlier, the visitor and the assistant chatted about various things.")
+
+def fake_legacy_sdk(profile):
+    """Module-like object standing in for google.generativeai."""
+    counter = itertools.count(1)
+    return SimpleNamespace(
+        configure=lambda api_key=None: None,
+        GenerativeModel=lambda **kwargs: FakeGenerativeModel(profile, counter, **kwargs),
+        protos=SimpleNamespace(Part=FakePart, FunctionResponse=FakeFunctionResponse, Content=FakeContent),
+    )
+
+# --- Veo (google.genai) --------------------------------------------------------------------
+
+class FakeOperation:
+    def __init__(self, name, started, profile):
+        self.name = name
+        self.started = started
+        self.profile = profile
+        self.done = False
+        self.response = None
+
+class FakeVeoClient:
+    operation_ids = itertools.count(1)
+    poll_calls_total = 0 # Across all clients, so the benchmark can report polling overhead
+
+    def __init__(self, profile, api_key=None):
+        self.profile = profile
+        self.models = SimpleNamespace(generate_videos=self.generate_videos)
+        self.operations = SimpleNamespace(get=self.get_operation)
+
+    def generate_videos(self, model=None, prompt=None, image=None, config=None):
+        time.sleep(self.profile.veo_start)
+        return FakeOperation(f"operations/fake-{next(self.operation_ids)}", time.perf_counter(), self.profile)
+
+    def get_operation(self, operation):
+        time.sleep(self.profile.veo_poll)
+        FakeVeoClient.poll_calls_total += 1
+        if time.perf_counter() - operation.started >= self.profile.veo_generation:
+            operation.done = True
+            video = SimpleNamespace(uri=f"https://fake.invalid/{operation.name}.mp4", name=None)
+            operation.response = SimpleNamespace(generated_videos=[SimpleNamespace(video=video)])
+        return operation
+
+def fake_veo_sdk(profile):
+    """Module-like objects standing in for google.genai and google.genai.types."""
+    genai = SimpleNamespace(Client=lambda api_key=None: FakeVeoClient(profile, api_key))
+    types = SimpleNamespace(GenerateVideosConfig=lambda **kwargs: kwargs)
+    return genai, types
+
+class FakeDownloader:
+    """Drop-in for VideoDownloader that copies a sample clip at the profile's byte rate."""
+
+    def __init__(self, sample_path, profile, chunk_size=256 * 1024, ready_bytes=1024 * 1024):
+        self.sample_path = sample_path
+        self.profile = profile
+        self.chunk_size = chunk_size
+        self.ready_bytes = ready_bytes
+
+    def download(self, url, dest_path, on_ready=None, headers=None):
+        sha256 = hashlib.sha256()
+        written = 0
+        ready_sent = False
+        with open(self.sample_path, "rb") as src, open(dest_path, "wb") as dst:
+            while True:
+                chunk = src.read(self.chunk_size)
+                if not chunk:
+                    break
+                time.sleep(len(chunk) / self.profile.download_rate)
+                dst.write(chunk)
+                sha256.update(chunk)
+                written += len(chunk)
+                if on_ready and not ready_sent and written >= self.ready_bytes:
+                    dst.flush()
+                    ready_sent = True
+                    on_ready(dest_path)
+        if on_ready and not ready_sent:
+            on_ready(dest_path)
+        return sha256.hexdigest()
@@ -0,0 +1,122 @@
+import threading
+
+class HistoryManager:
+    """
+    Keeps one chat session's history under a token budget.
+    Once the budget is exceeded, older turns are summarised on a background thread and the summary
+    replaces them at the start of the next turn. The system prompt lives on the model, so it is never folded,
+    and the most recent turns are always kept verbatim.
+    """
+
+    SUMMARY_PREFIX = "Summary of our earlier conversation:"
+
+    def __init__(self, session, summarizer, budget_tokens=8000, keep_recent_turns=6):
+        self.session = session
+        self.summarizer = summarizer  # GenerativeModel without tools, used for the rolling summary
+        self.budget_tokens = budget_tokens
+        self.keep_recent_turns = keep_recent_turns
+
+        self.counts = []              # Estimated tokens per history entry, same order as session.history
+        self.summary = ""
+        self.pending = None           # (summary text, number of entries it replaces) waiting to be applied
+        self.summarizing = False
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def estimate_tokens(content):
+        # ~4 characters per token is close enough for budgeting and needs no API round-trip
+        chars = 0
+        for part in content.parts:
+            if part.text:
+                chars += len(part.text)
+            elif part.function_call.name:
+                chars += len(part.function_call.name) + len(str(dict(part.function_call.args)))
+            elif part.function_response.name:
+                chars += len(part.function_response.name) + len(str(part.function_response.response))
+        return max(1, chars // 4)
+
+    def turn_token_counts(self):
+        """Estimated tokens per history entry as (role, tokens) pairs."""
+        self.sync_counts()
+        return [(content.role, count) for content, count in zip(self.session.history, self.counts)]
+
+    def total_tokens(self):
+        self.sync_counts()
+        return sum(self.counts)
+
+    def sync_counts(self):
+        history = self.session.history
+        if len(self.counts) > len(history):
+            self.counts = []
+        for content in history[len(self.counts):]:
+            self.counts.append(self.estimate_tokens(content))
+
+    def before_turn(self):
+        """
+        Swaps in a finished summary. Called on the worker thread, so it never races send_message.
+        Returns (summary entries, number of older entries kept after them) when history was folded, else None.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, None
+        if not pending:
+            return None
+
+        summary, folded = pending
+        history = self.session.history
+        summary_entries = [
+            {"role": "user", "parts": [{"text": f"{self.SUMMARY_PREFIX}\n{summary}"}]},
+            {"role": "model", "parts": [{"text": "Understood, I remember."}]},
+        ]
+        self.session.history = summary_entries + list(history[folded:])
+        self.counts = []
+        self.sync_counts()
+        return summary_entries, len(history) - folded
+
+    def after_turn(self):
+        if self.total_tokens() <= self.budget_tokens:
+            return
+        with self.lock:
+            if self.summarizing or self.pending:
+                return
+            cut = self.split_point()
+            if cut <= 0:
+                return
+            self.summarizing = True
+
+        old_turns = list(self.session.history[:cut])
+        threading.Thread(target=self.summarize, args=(old_turns, cut), daemon=True).start()
+
+    def split_point(self):
+        # Only cut in front of a real user message, never between a function call and its response
+        history = self.session.history
+        user_turns = 0
+        for index in range(len(history) - 1, -1, -1):
+            content = history[index]
+            if content.role == "user" and any(part.text for part in content.parts):
+                user_turns += 1
+                if user_turns == self.keep_recent_turns:
+                    return index
+        return 0
+
+    def summarize(self, old_turns, folded):
+        lines = []
+        for content in old_turns:
+            text = " ".join(part.text for part in content.parts if part.text)
+            if text:
+                lines.append(f"{content.role}: {text}")
+        prompt = (
+            "Condense this conversation into a short summary that keeps names, facts, decisions and open questions. "
+            "Write it from the assistant's point of view.\n\n"
+            + "\n".join(lines)
+        )
+        try:
+            response = self.summarizer.generate_content(prompt)
+            summary = response.text.strip()
+            with self.lock:
+                self.summary = summary
+                self.pending = (summary, folded)
+        except Exception as e:
+            print(f"History summarisation failed: {e}")
+        finally:
+            with self.lock:
+                self.summarizing = False
@@ -1,8 +1,14 @@
+from src.Tracing import tracer
+# Started before anything heavy is imported, so they cover the whole cold start
+startup_window = tracer.start("startup_to_window")
+startup_model = tracer.start("startup_to_model_ready")
+
 import sys
 import os
+import argparse
 from dotenv import load_dotenv 
+from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QApplication
-from src.Model import AIModel
 from src.View import AIView
 from src.Controller import AppController
 
@@ -10,27 +16,74 @@ load_dotenv()
 
 API_KEY = os.getenv("GEMINI_API_KEY")
 VEO_API_KEY = os.getenv("VEO_API_KEY") # Load the Veo key
+REPLY_CACHE_TTL = int(os.getenv("REPLY_CACHE_TTL") or 0) # Seconds to reuse replies to opening messages; 0 = off
+
+def build_model():
+    # Imported here so the Gemini SDKs load on the model thread, not before the window
+    from src.Model import AIModel
+    return AIModel(api_key=API_KEY, veo_api_key=VEO_API_KEY, system_instruction="You are a helpful assistant.",
+                   history_dir=os.path.join(os.getcwd(), "ChatHistory"), reply_cache_ttl=REPLY_CACHE_TTL)
+
+def report_startup(span, label):
+    span.end()
+    print(f"Startup: {label} after {span.duration:.2f}s")
+
+def run_server(port):
+    """Headless mode: no window, just the HTTP/WebSocket API (see Server.py)."""
+    from src.Server import AssistantServer
+    from src.CharacterRegistry import CharacterRegistry
+
+    tracer.set_output(os.path.join(os.getcwd(), "traces.jsonl"))
+    model = build_model()
+    report_startup(startup_model, "model ready")
+    server = AssistantServer(model, CharacterRegistry(os.path.join(os.getcwd(), "Characters")), port=port)
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        model.close()
 
 def main():
-    app = QApplication(sys.argv)
-    
+    parser = argparse.ArgumentParser(description="AI Agent Assistant")
+    parser.add_argument("--server", action="store_true", help="run the headless HTTP/WebSocket API instead of the window")
+    parser.add_argument("--port", type=int, default=int(os.getenv("AI_SERVER_PORT") or 8765))
+    args, qt_args = parser.parse_known_args()
+
     if not API_KEY:
         print("CRITICAL ERROR: GEMINI_API_KEY not found.")
         sys.exit(1)
 
-    # Initialize MVC
+    if args.server:
+        run_server(args.port)
+        return
+
+    app = QApplication(sys.argv[:1] + qt_args)
+
+    # Spans go to traces.jsonl; per-stage histograms are dumped to trace_summary.json on exit
+    tracer.set_output(os.path.join(os.getcwd(), "traces.jsonl"))
+    app.aboutToQuit.connect(lambda: tracer.dump(os.path.join(os.getcwd(), "trace_summary.json")))
+
+    # Initialize MVC: window first, the model follows on a background thread
     controller = AppController()
-    
-    system_prompt = "You are a helpful assistant."
-    
-    # Pass both keys to the model
-    model = AIModel(api_key=API_KEY, veo_api_key=VEO_API_KEY, system_instruction=system_prompt)
     view = AIView(controller)
-
-    controller.set_model(model)
     controller.set_view(view)
 
+    controller.model_loader.ready.connect(lambda _model: report_startup(startup_model, "model ready"))
+    # AI_SERVER_PORT also serves kiosks from this window's process, sharing its model
+    if os.getenv("AI_SERVER_PORT"):
+        def start_server(model):
+            from src.Server import AssistantServer
+            from src.CharacterRegistry import CharacterRegistry
+            AssistantServer(model, CharacterRegistry(controller.char_base_path), port=args.port).start_in_thread()
+        controller.model_loader.ready.connect(start_server)
+    controller.load_model_async(build_model)
+
+    app.aboutToQuit.connect(controller.shutdown)
+
     view.show()
+    # Runs once the event loop has painted the window
+    QTimer.singleShot(0, lambda: report_startup(startup_window, "window shown"))
     sys.exit(app.exec())
 
 if __name__ == "__main__":
@@ -0,0 +1,172 @@
+import itertools
+from collections import OrderedDict
+from PyQt6.QtCore import QObject, QThreadPool, QUrl, Qt, pyqtSignal
+from PyQt6.QtGui import QImage, QImageReader
+from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
+from PyQt6.QtMultimediaWidgets import QVideoWidget
+
+class PlayerSlot:
+    """One player with its own audio output and video surface."""
+
+    def __init__(self):
+        self.widget = QVideoWidget()
+        self.player = QMediaPlayer()
+        self.audio = QAudioOutput()
+        self.player.setAudioOutput(self.audio)
+        self.player.setVideoOutput(self.widget)
+        self.path = None
+        self.last_used = 0
+        self.widget.hide()
+
+    def load(self, path):
+        self.path = path
+        self.player.setSource(QUrl.fromLocalFile(path))
+
+class MediaPool(QObject):
+    """
+    Small pool of players that have their clips loaded ahead of time.
+    A new clip starts on a spare player and is only swapped on screen once its first frame
+    has arrived, so the previous picture stays up instead of flashing black.
+    """
+    media_status_changed = pyqtSignal(object) # Status of the player currently on screen
+    frame_shown = pyqtSignal()                # A newly started clip is now visible
+
+    def __init__(self, size=3):
+        super().__init__()
+        # Needs at least two players: one on screen and one to start the next clip on
+        self.slots = [PlayerSlot() for _ in range(size)]
+        self.active = None   # Slot on screen
+        self.pending = None  # Slot told to play, waiting for its first frame
+        self.clock = itertools.count(1)
+
+        for slot in self.slots:
+            slot.player.mediaStatusChanged.connect(lambda status, slot=slot: self.on_status(slot, status))
+            slot.widget.videoSink().videoFrameChanged.connect(lambda _frame, slot=slot: self.on_frame(slot))
+
+    def widgets(self):
+        return [slot.widget for slot in self.slots]
+
+    def slot_for(self, path):
+        for slot in self.slots:
+            if slot.path == path:
+                return slot
+        return None
+
+    def spare_slot(self):
+        # Least recently used player that is neither on screen nor about to be
+        candidates = [slot for slot in self.slots if slot is not self.active and slot is not self.pending]
+        return min(candidates, key=lambda slot: slot.last_used)
+
+    def preload(self, paths):
+        """Loads likely next clips into spare players. One player is always left free for unplanned clips."""
+        for path in paths[:len(self.slots) - 1]:
+            if not self.slot_for(path):
+                slot = self.spare_slot()
+                slot.load(path)
+                slot.last_used = next(self.clock)
+
+    def play(self, path):
+        slot = self.slot_for(path)
+        if slot is None:
+            slot = self.spare_slot()
+            slot.load(path)
+        else:
+            slot.player.setPosition(0) # Rewind clips that were played before
+
+        slot.last_used = next(self.clock)
+        replaced = self.pending
+        if replaced and replaced is not slot and replaced is not self.active:
+            # Superseded before its first frame: it would otherwise keep playing hidden, audio and all
+            replaced.player.pause()
+        self.pending = slot
+        slot.player.play()
+
+    def on_frame(self, slot):
+        if slot is not self.pending:
+            return
+        # First frame of the new clip is ready: swap it on screen
+        previous, self.active, self.pending = self.active, slot, None
+        slot.widget.show()
+        if previous and previous is not slot:
+            previous.widget.hide()
+            previous.player.pause()
+        self.frame_shown.emit()
+
+    def on_status(self, slot, status):
+        if status == QMediaPlayer.MediaStatus.InvalidMedia and slot is self.pending:
+            self.pending = None # Never going to produce a frame
+        if slot is self.active or (slot is self.pending and status == QMediaPlayer.MediaStatus.InvalidMedia):
+            self.media_status_changed.emit(status)
+
+    def hide_video(self):
+        for slot in self.slots:
+            slot.widget.hide()
+        if self.active:
+            self.active.player.pause()
+        self.active = None
+
+    def is_playing(self):
+        active = self.pending or self.active
+        return bool(active) and active.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState
+
+    def set_volume(self, volume):
+        for slot in self.slots:
+            slot.audio.setVolume(volume)
+
+class PixmapCache:
+    """Decoded, pre-scaled idle images (filled from ImageLoader), bounded by their approximate memory size."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict() # path -> QPixmap, least recently used first
+        self.bytes = 0
+
+    def peek(self, image_path):
+        """Cached pixmap or None, without decoding anything."""
+        pixmap = self.items.get(image_path)
+        if pixmap is not None:
+            self.items.move_to_end(image_path)
+        return pixmap
+
+    def put(self, image_path, pixmap):
+        self.forget(image_path)
+        self.items[image_path] = pixmap
+        self.bytes += self.cost(pixmap)
+        while self.bytes > self.max_bytes and len(self.items) > 1:
+            _, old = self.items.popitem(last=False)
+            self.bytes -= self.cost(old)
+
+    def forget(self, image_path):
+        old = self.items.pop(image_path, None)
+        if old is not None:
+            self.bytes -= self.cost(old)
+
+    def cost(self, pixmap):
+        return pixmap.width() * pixmap.height() * 4
+
+class ImageLoader(QObject):
+    """Decodes and scales images on the global thread pool; QImage is safe off the GUI thread, QPixmap is not."""
+    loaded = pyqtSignal(str, QImage) # path, decoded image (null if it could not be read)
+
+    def __init__(self, size):
+        super().__init__()
+        self.size = size
+        self.in_flight = set()
+
+    def load(self, image_path):
+        if image_path in self.in_flight:
+            return
+        self.in_flight.add(image_path)
+        QThreadPool.globalInstance().start(lambda: self.decode(image_path))
+
+    def decode(self, image_path):
+        reader = QImageReader(image_path)
+        reader.setAutoTransform(True)
+        image = reader.read()
+        if not image.isNull():
+            image = image.scaled(self.size, Qt.AspectRatioMode.IgnoreAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+        self.loaded.emit(image_path, image) # Queued to the GUI thread
+
+    def finished(self, image_path):
+        self.in_flight.discard(image_path)
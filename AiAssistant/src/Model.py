@@ -1,149 +1,446 @@
-import google.generativeai as genai_legacy # Legacy SDK for Chat/Tools
-from google import genai # New SDK for Veo 3
-from google.genai import types
-from src.Tools import ToolKit
+from src.Tools import ToolKit, current_animation
+from src.VideoCache import VideoCache
+from src.VeoScheduler import VeoJob
+from src.HistoryManager import HistoryManager
+from src.ConversationStore import ConversationStore
+from src.ToolExecutor import ToolExecutor
+from src.VeoAssets import VeoAssets
+from src.ReplyCache import CachedReply, ReplyCache
+from src.Downloader import VideoDownloader, DownloadError
+from src.Tracing import tracer
 import time
 import os
-import requests 
+import hashlib
+import threading
+from collections import OrderedDict
+
+# SDKs are imported on first use: they dominate startup time and Veo is often never switched on
+genai_legacy = None # Legacy SDK for Chat/Tools (google.generativeai)
+genai = None        # New SDK for Veo 3 (google.genai)
+types = None        # google.genai.types
+sdk_lock = threading.Lock()
+
+def load_chat_sdk():
+    global genai_legacy
+    with sdk_lock:
+        if genai_legacy is None:
+            with tracer.span("import_chat_sdk"):
+                import google.generativeai as sdk
+            genai_legacy = sdk
+    return genai_legacy
+
+def load_veo_sdk():
+    global genai, types
+    with sdk_lock:
+        if genai is None:
+            with tracer.span("import_veo_sdk"):
+                from google import genai as sdk
+                from google.genai import types as sdk_types
+            genai, types = sdk, sdk_types
+    return genai
 
 class AIModel:
-    def __init__(self, api_key, system_instruction, veo_api_key=None):
+    VEO_MODEL = "veo-3.1-generate-preview"
+    VEO_ASPECT_RATIO = "9:16"
+
+    def __init__(self, api_key, system_instruction, veo_api_key=None, cache_dir=None, max_sessions=8, history_dir=None,
+                 context_budget=8000, keep_recent_turns=6, resume_entries=40, reply_cache_ttl=0):
         # Configure Legacy Chat (Gemini 2.5 Flash)
-        genai_legacy.configure(api_key=api_key)
+        load_chat_sdk().configure(api_key=api_key)
         self.api_key = api_key
         self.veo_api_key = veo_api_key 
         self.tools = ToolKit.tools_list
+        self.tool_executor = ToolExecutor(self.tools, ToolKit.timeouts, blocking=ToolKit.blocking)
+        self.video_cache = VideoCache(cache_dir or os.path.join(os.getcwd(), "VeoCache"))
+        self.veo_assets = VeoAssets() # Shared client and prepared frames
+        self.downloader = VideoDownloader()
+
+        # Chat sessions are pooled per (character, system prompt) so switching back keeps the conversation
+        self.sessions = OrderedDict() # key -> (GenerativeModel, ChatSession, HistoryManager), least recently used first
+        self.max_sessions = max_sessions
+        # If history_dir is set, every turn is logged there and new sessions resume from the log
+        self.store = ConversationStore(history_dir) if history_dir else None
+        self.resume_entries = resume_entries
+        self.session_lock = threading.Lock()
+
+        # Older turns are folded into a rolling summary once a session passes this many tokens
+        self.context_budget = context_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.summarizer = genai_legacy.GenerativeModel(model_name='gemini-2.5-flash')
+
+        # Opening messages of fresh sessions can be answered from memory (off when reply_cache_ttl is 0)
+        self.reply_cache = ReplyCache(reply_cache_ttl) if reply_cache_ttl else None
         self.init_model(system_instruction)
 
-    def init_model(self, prompt):
+    def init_model(self, prompt, character=None):
+        handle = self.open_session(prompt, character)
+        with self.session_lock:
+            self.model, self.chat_session, self.history_manager, self.session_key_current = handle
+
+    def open_session(self, prompt, character=None):
+        """
+        Returns a (GenerativeModel, ChatSession, HistoryManager, key) handle from the pool without making it current.
+        The server keeps one per connected session and passes it to chat()/chat_stream().
+        """
         if not prompt or not prompt.strip():
             prompt = "You are a helpful assistant."
 
+        key = self.session_key(character, prompt)
+        with self.session_lock:
+            if key in self.sessions:
+                self.sessions.move_to_end(key)
+            else:
+                self.sessions[key] = self.create_session(key, prompt)
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False) # Already in the store turn by turn
+            return self.sessions[key] + (key,)
+
+    def session_key(self, character, prompt):
+        # Prompt hash in the key means an edited config.txt gets a fresh session
+        return (character or "default", hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16])
+
+    def create_session(self, key, prompt):
         # Use Legacy SDK for Chat/Tools to maintain stability with Controller
-        self.model = genai_legacy.GenerativeModel(
+        model = genai_legacy.GenerativeModel(
             model_name='gemini-2.5-flash',
             tools=self.tools,
             system_instruction=prompt
         )
-        self.chat_session = self.model.start_chat(enable_automatic_function_calling=True)
+        # Tools are executed by chat_stream() itself; the SDK's automatic function calling cannot stream
+        session = model.start_chat(history=self.resume_history(key))
+        history = HistoryManager(session, self.summarizer, self.context_budget, self.keep_recent_turns)
+        return model, session, history
+
+    def set_tools(self, tools):
+        # Only sessions created after this call see the new tool list
+        self.tools = tools
+        self.tool_executor.set_tools(tools)
+
+    def update_system_instruction(self, new_prompt, character=None):
+        self.init_model(new_prompt, character)
 
-    def update_system_instruction(self, new_prompt):
-        self.init_model(new_prompt)
+    def resume_history(self, key):
+        # Latest conversation with this character, whatever prompt it was under; nothing is re-sent to Gemini
+        if not self.store:
+            return None
+        with tracer.span("resume_history", character=key[0]) as span:
+            history = self.store.resume(key[0], self.resume_entries)
+            span.set(entries=len(history))
+        return history or None
 
-    def chat(self, user_input):
+    def log_turn(self, key, contents):
+        if not self.store or not contents:
+            return
         try:
-            response = self.chat_session.send_message(user_input)
-            
-            # FIX: Safely check if the response has text content.
-            # If the model runs a tool but says nothing, accessing .text directly throws a ValueError.
-            if response.candidates and response.candidates[0].content.parts:
-                return response.text
-            else:
-                return "(Action executed)" # Fallback response for silent actions
+            self.store.append(key[0], key[1], [self.content_dict(content) for content in contents])
+        except Exception as e:
+            print(f"Could not save chat history for {key[0]}: {e}")
 
-        except ValueError:
-            # Catch the specific "Invalid operation" if .text is accessed on empty content
-            return "(Action executed)"
+    def log_summary(self, key, summary_entries, kept):
+        if not self.store:
+            return
+        try:
+            self.store.append_summary(key[0], key[1], summary_entries, kept)
         except Exception as e:
-            return f"Error communicating with Gemini: {str(e)}"
+            print(f"Could not save chat summary for {key[0]}: {e}")
+
+    def content_dict(self, content):
+        return content if isinstance(content, dict) else genai_legacy.protos.Content.to_dict(content)
+
+    def search_history(self, query, character=None, limit=20):
+        """Full-text search over every logged conversation."""
+        return self.store.search(query, character, limit) if self.store else []
 
-    def generate_veo_video(self, prompt_text, image_path):
+    def close(self):
+        self.tool_executor.shutdown()
+        if self.store:
+            self.store.close()
+
+    def turn_token_counts(self):
+        """Estimated tokens per turn of the current session, as (role, tokens) pairs."""
+        return self.history_manager.turn_token_counts()
+
+    def chat(self, user_input, handle=None):
+        reply = "".join(self.chat_stream(user_input, stream=False, handle=handle))
+        return reply or "(Action executed)" # Fallback response for silent actions
+
+    def chat_result(self, user_input, handle=None):
+        """Runs a turn like chat(), but returns (reply text, names of tools called), or None if it failed."""
+        turn = self.chat_stream(user_input, stream=False, handle=handle)
+        while True:
+            try:
+                next(turn)
+            except StopIteration as done:
+                return done.value
+
+    def chat_stream(self, user_input, stream=True, handle=None):
         """
-        Generates a video using Veo 3 (via New GenAI SDK).
+        Yields the reply text chunk by chunk as Gemini produces it.
+        Any function calls in a turn are executed locally and their results sent back, then streaming resumes.
+        Returns (reply text, names of tools called), or None if the turn failed.
         """
-        if not self.veo_api_key:
-            return None, "Error: VEO_API_KEY not set."
+        # Hold on to this turn's session in case a character switch replaces self.chat_session mid-reply
+        if handle:
+            _, session, history, key = handle
+        else:
+            with self.session_lock:
+                session, history, key = self.chat_session, self.history_manager, self.session_key_current
 
-        print(f"Generating Veo 3 video for: {prompt_text}")
+        # First turns are the same greetings over and over; only they are safe to answer from the cache
+        if self.reply_cache and self.reply_cache.cacheable(user_input) and self.is_first_turn(session):
+            return (yield from self.cached_turn(user_input, stream, session, history, key))
+        return (yield from self.model_turn(user_input, stream, session, history, key))
 
+    def is_first_turn(self, session):
         try:
-            # 1. Initialize New Client
-            client = genai.Client(api_key=self.veo_api_key)
-
-            # 2. Prepare Image Input
-            if not os.path.exists(image_path):
-                return None, f"Image not found: {image_path}"
-            
-            with open(image_path, "rb") as f:
-                raw_bytes = f.read()
-
-            # Image Payload (Used for both Start and End frames)
-            image_payload = {
-                "image_bytes": raw_bytes, 
-                "mime_type": "image/png"
-            }
-
-            # 3. Configure Veo 3
-            # - aspect_ratio="9:16" for Portrait (Mobile/App style)
-            # - last_frame=image_payload forces the video to Loop (Start == End)
-            config = types.GenerateVideosConfig(
-                aspect_ratio="9:16",
-                last_frame=image_payload 
-            )
+            return not session.history
+        except Exception:
+            self.recover_session(session, None)
+            return False
+
+    def cached_turn(self, user_input, stream, session, history, key):
+        cache = self.reply_cache
+        # Keyed by prompt hash only, so every visitor session of the same character shares entries
+        prompt_key = key[1]
+        with tracer.span("reply_cache_lookup") as span:
+            reply, score = cache.get(prompt_key, user_input)
+            flight, leader = (None, False) if reply else cache.join(prompt_key, user_input)
+            if flight and not leader:
+                # The same message is already being answered for another visitor; reuse that reply
+                span.set(collapsed=True)
+                flight.done.wait(timeout=120)
+                reply, flight = flight.reply, None
+            span.set(hit=reply is not None, score=round(score, 3))
+
+        if reply:
+            self.replay_turn(reply, user_input, session, history, key)
+            yield reply.text
+            return reply.text, set()
+
+        cached = None
+        try:
+            logged = len(session.history)
+            outcome = yield from self.model_turn(user_input, stream, session, history, key)
+            # Turns whose tools had side effects (files, apps) must really run again next time
+            if outcome and outcome[1] <= {"set_animation"}:
+                choice = current_animation.get()
+                contents = [self.content_dict(content) for content in session.history[logged:]]
+                cached = CachedReply(outcome[0], choice.name if choice else None, contents)
+        finally:
+            if flight:
+                cache.finish(prompt_key, user_input, flight, cached)
+        return outcome
+
+    def replay_turn(self, reply, user_input, session, history, key):
+        """Adds a cached turn to the session as if the model had just produced it, and replays its animation."""
+        contents = reply.turn_contents(user_input)
+        session.history = list(session.history) + contents
+        history.after_turn()
+        self.log_turn(key, contents)
+        choice = current_animation.get()
+        if choice is not None and reply.animation:
+            choice.name = reply.animation
+
+    def model_turn(self, user_input, stream, session, history, key):
+        """Runs one turn against Gemini. Returns (reply text, names of tools called), or None if it failed."""
+        reply_parts, tools_called = [], set()
+        before = None
+        try:
+            folded = history.before_turn()
+            if folded:
+                self.log_summary(key, *folded)
+            before = list(session.history)
+            logged = len(before)
+            message = user_input
+            while True:
+                span = tracer.start("send_message", stream=stream)
+                try:
+                    response = session.send_message(message, stream=stream)
+
+                    for chunk in (response if stream else [response]):
+                        text = self.chunk_text(chunk)
+                        if text:
+                            if "first_token" not in span.attrs:
+                                span.set(first_token=time.perf_counter() - span.start)
+                            reply_parts.append(text)
+                            yield text
+                finally:
+                    span.end()
+
+                calls = self.function_calls(response)
+                if not calls:
+                    break
+                tools_called.update(call.name for call in calls)
+                message = self.run_tools(calls)
+
+            history.after_turn()
+            self.log_turn(key, session.history[logged:])
+            return "".join(reply_parts) or "(Action executed)", tools_called
+
+        except Exception as e:
+            print(f"Error communicating with Gemini: {e}")
+            self.recover_session(session, before)
+            yield f"Error communicating with Gemini: {str(e)}"
+            return None
 
-            # 4. Start Generation Operation
-            operation = client.models.generate_videos(
-                model="veo-3.1-generate-preview", 
-                prompt=prompt_text,
+    def recover_session(self, session, before):
+        """
+        Drops a failed turn so the pooled session stays usable. A stream that broke (or stopped for SAFETY/RECITATION)
+        makes session.history raise until it is rewound, and a failed tool round leaves an unanswered function call.
+        """
+        try:
+            if getattr(session, "last", None) is not None:
+                session.rewind()
+            if before is not None:
+                session.history = before
+        except Exception as e:
+            print(f"Could not reset the chat session after a failed turn: {e}")
+
+    def chunk_text(self, chunk):
+        # Accessing .text directly throws a ValueError when a chunk only holds a function call
+        if not chunk.candidates or not chunk.candidates[0].content.parts:
+            return ""
+        return "".join(part.text for part in chunk.candidates[0].content.parts if part.text)
+
+    def function_calls(self, response):
+        if not response.candidates:
+            return []
+        return [part.function_call for part in response.candidates[0].content.parts if part.function_call.name]
+
+    def run_tools(self, calls):
+        """Runs the requested tools in parallel and packs the results into a single function-response message."""
+        results = self.tool_executor.run([(call.name, dict(call.args)) for call in calls])
+        parts = [genai_legacy.protos.Part(function_response=genai_legacy.protos.FunctionResponse(
+            name=call.name, response={"result": result}
+        )) for call, result in zip(calls, results)]
+        return genai_legacy.protos.Content(role="user", parts=parts)
+
+    def generate_veo_video(self, prompt_text, image_path, character=None):
+        """
+        Generates a video using Veo 3 (via New GenAI SDK), blocking until it is downloaded.
+        Clips are cached per character, so a repeated prompt + frame returns instantly.
+        The GUI goes through VeoScheduler instead, which drives the same begin/poll/finish steps.
+        """
+        job = VeoJob(prompt_text, image_path, character)
+        try:
+            if not self.begin_veo_job(job):
+                # Poll for Completion
+                while not job.operation.done:
+                    time.sleep(5) 
+                    self.poll_veo_job(job)
+                self.finish_veo_job(job)
+            return job.result_path, job.error
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return None, f"Veo 3 Generation Failed: {str(e)}"
+
+    def begin_veo_job(self, job):
+        """
+        Starts the Veo operation for a job.
+        Returns True if the job is already settled (cache hit or error) and needs no polling.
+        """
+        if not self.veo_api_key:
+            job.error = "Error: VEO_API_KEY not set."
+            return True
+
+        # 1. Prepare Image Input (read and downscaled once per idle.png version)
+        if not os.path.exists(job.image_path):
+            job.error = f"Image not found: {job.image_path}"
+            return True
+        asset = self.veo_assets.frame(job.image_path)
+
+        # 2. Check the clip cache before starting a (slow) generation job
+        job.cache_key = VideoCache.make_key(self.VEO_MODEL, job.prompt, asset.raw_bytes, asset.raw_bytes, self.VEO_ASPECT_RATIO)
+        cached_path = self.video_cache.get(job.character, job.cache_key)
+        if cached_path:
+            print(f"Veo 3 cache hit: {cached_path}")
+            job.result_path = cached_path
+            return True
+
+        print(f"Generating Veo 3 video for: {job.prompt}")
+        load_veo_sdk()
+        job.client = self.veo_assets.client(genai, self.veo_api_key)
+
+        # Image Payload (Used for both Start and End frames)
+        job.operation = self.start_veo_operation(job, self.veo_assets.inline_image(asset))
+
+        print("Veo 3 Operation started...")
+        return False
+
+    def start_veo_operation(self, job, image_payload):
+        # 3. Configure Veo 3
+        # - aspect_ratio="9:16" for Portrait (Mobile/App style)
+        # - last_frame=image_payload forces the video to Loop (Start == End)
+        config = types.GenerateVideosConfig(
+            aspect_ratio=self.VEO_ASPECT_RATIO,
+            last_frame=image_payload 
+        )
+
+        # 4. Start Generation Operation
+        with tracer.span("veo_start", character=job.character, request_id=job.request_id):
+            return job.client.models.generate_videos(
+                model=self.VEO_MODEL, 
+                prompt=job.prompt,
                 image=image_payload, # Start Frame
                 config=config        # Config with End Frame & Ratio
             )
-            
-            print("Veo 3 Operation started...")
-
-            # 5. Poll for Completion
-            while not operation.done:
-                time.sleep(5) 
-                operation = client.operations.get(operation)
-                print("Veo 3 Status: Processing...")
-
-            # 6. Retrieve Result
-            if not operation.response.generated_videos:
-                return None, "No video generated in response."
-
-            video_result = operation.response.generated_videos[0]
-            output_filename = "temp_veo_gen.mp4"
-            
-            # 7. Manual Download Logic
-            try:
-                # CASE A: Result has a Direct URI (Most common for Veo)
-                if hasattr(video_result.video, 'uri') and video_result.video.uri:
-                    video_uri = video_result.video.uri
-                    print(f"Downloading video from URI...")
-                    
-                    # Append API Key if not present (Required for authentication)
-                    if "key=" not in video_uri:
-                        separator = "&" if "?" in video_uri else "?"
-                        download_url = f"{video_uri}{separator}key={self.veo_api_key}"
-                    else:
-                        download_url = video_uri
-                        
-                    resp = requests.get(download_url)
-                    if resp.status_code == 200:
-                        with open(output_filename, "wb") as f:
-                            f.write(resp.content)
-                    else:
-                        return None, f"Download Error {resp.status_code}: {resp.text}"
-
-                # CASE B: Result is a File API Reference
-                elif hasattr(video_result.video, 'name') and video_result.video.name:
-                    print(f"Downloading video via Client API...")
-                    file_bytes = client.files.download(name=video_result.video.name)
-                    with open(output_filename, "wb") as f:
-                        f.write(file_bytes)
-
-                else:
-                    return None, "Could not find valid download URI or Name."
-
-            except Exception as download_err:
-                import traceback
-                traceback.print_exc()
-                return None, f"Download Exception: {str(download_err)}"
-
-            print(f"Veo 3 Video Saved: {output_filename}")
-            return output_filename, None
 
-        except Exception as e:
+    def poll_veo_job(self, job):
+        """Refreshes the job's operation once. Returns True when Veo has finished."""
+        with tracer.span("veo_poll", character=job.character, request_id=job.request_id):
+            job.operation = job.client.operations.get(job.operation)
+        print("Veo 3 Status: Processing...")
+        return job.operation.done
+
+    def finish_veo_job(self, job):
+        """Downloads a finished operation's clip into the cache, filling in job.result_path or job.error."""
+        # 6. Retrieve Result
+        operation = job.operation
+        if not operation.response.generated_videos:
+            job.error = "No video generated in response."
+            return
+
+        video_result = operation.response.generated_videos[0]
+        # Download into a temp file next to the cache slot, then rename atomically
+        output_filename = self.video_cache.temp_path(job.character)
+        
+        # 7. Streamed Download (playback can start via job.on_ready before the last byte lands)
+        try:
+            # CASE A: Result has a Direct URI (Most common for Veo)
+            if hasattr(video_result.video, 'uri') and video_result.video.uri:
+                video_uri = video_result.video.uri
+            # CASE B: Result is a File API Reference; stream it from the Files API download endpoint
+            elif hasattr(video_result.video, 'name') and video_result.video.name:
+                video_uri = f"https://generativelanguage.googleapis.com/v1beta/{video_result.video.name}:download?alt=media"
+            else:
+                self.video_cache.discard(output_filename)
+                job.error = "Could not find valid download URI or Name."
+                return
+
+            # Append API Key if not present (Required for authentication)
+            if "key=" not in video_uri:
+                separator = "&" if "?" in video_uri else "?"
+                download_url = f"{video_uri}{separator}key={self.veo_api_key}"
+            else:
+                download_url = video_uri
+
+            print(f"Downloading video from URI...")
+            on_ready = (lambda path: job.on_ready(job, path)) if job.on_ready else None
+            with tracer.span("veo_download", character=job.character, request_id=job.request_id):
+                job.checksum = self.downloader.download(download_url, output_filename, on_ready)
+
+        except DownloadError as download_err:
+            self.video_cache.discard(output_filename)
+            job.error = str(download_err)
+            return
+        except Exception as download_err:
             import traceback
             traceback.print_exc()
-            return None, f"Veo 3 Generation Failed: {str(e)}"
\ No newline at end of file
+            self.video_cache.discard(output_filename)
+            job.error = f"Download Exception: {str(download_err)}"
+            return
+
+        job.result_path = self.video_cache.commit(job.character, job.cache_key, output_filename)
+        print(f"Veo 3 Video Saved: {job.result_path}")
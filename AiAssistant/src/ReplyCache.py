@@ -0,0 +1,115 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+def normalize(text):
+    """Lowercase words only, so "Hi!" and "hi" share an entry."""
+    return " ".join(re.findall(r"[a-z0-9']+", text.lower()))
+
+def word_overlap(a, b):
+    """Jaccard similarity of the two texts' word sets: word order and repeats do not matter, changed words do."""
+    a, b = set(a.split()), set(b.split())
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+class CachedReply:
+    def __init__(self, text, animation, contents):
+        self.text = text
+        self.animation = animation # What set_animation picked during the original turn, or None
+        self.contents = contents   # History entries of the original turn as content dicts, user message first
+        self.created = time.time()
+
+    def turn_contents(self, user_input):
+        """The cached turn as it should appear in a session's history, with this visitor's own wording."""
+        return [{"role": "user", "parts": [{"text": user_input}]}] + self.contents[1:]
+
+class InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.reply = None # Set by the leader if its reply was cacheable
+
+class ReplyCache:
+    """
+    Replies to opening messages ("hi", "who are you?"), keyed by system prompt hash plus normalised input.
+    Entries expire after ttl seconds and the least recently used go first past max_entries.
+    A miss falls back to the cached input under the same prompt whose words overlap most, if they pass threshold.
+    At the default 0.9, one changed word in an opener shorter than ten words is never a hit
+    ("what can't you do" is not "what can you do").
+    Identical requests that arrive while one is already being answered wait for it instead of calling the model.
+    """
+
+    def __init__(self, ttl=600, max_entries=256, threshold=0.9, max_input_chars=200):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold             # word_overlap() of normalised texts; 1.0 means exact only
+        self.max_input_chars = max_input_chars # Longer messages are unlikely to repeat; not worth caching
+        self.entries = OrderedDict()           # (prompt key, normalised input) -> CachedReply, least recently used first
+        self.in_flight = {}                    # (prompt key, normalised input) -> InFlight
+        self.lock = threading.Lock()
+        self.hits = self.similar_hits = self.collapsed = self.misses = 0
+
+    def cacheable(self, user_input):
+        return isinstance(user_input, str) and 0 < len(user_input) <= self.max_input_chars and bool(normalize(user_input))
+
+    def get(self, key, user_input):
+        """Returns (CachedReply, similarity) for the best live entry, or (None, 0.0)."""
+        text = normalize(user_input)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get((key, text))
+            if entry and now - entry.created <= self.ttl:
+                self.entries.move_to_end((key, text))
+                self.hits += 1
+                return entry, 1.0
+
+            best, best_score = None, 0.0
+            for (entry_key, entry_text), candidate in list(self.entries.items()):
+                if now - candidate.created > self.ttl:
+                    del self.entries[(entry_key, entry_text)]
+                    continue
+                if entry_key != key or self.threshold >= 1.0:
+                    continue
+                score = word_overlap(text, entry_text)
+                if score > best_score:
+                    best, best_score = (entry_key, entry_text), score
+            if best and best_score >= self.threshold:
+                self.entries.move_to_end(best)
+                self.similar_hits += 1
+                return self.entries[best], best_score
+            return None, best_score
+
+    def put(self, key, user_input, reply):
+        with self.lock:
+            self.entries[(key, normalize(user_input))] = reply
+            self.entries.move_to_end((key, normalize(user_input)))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def join(self, key, user_input):
+        """
+        Registers interest in answering user_input. Returns (flight, leader):
+        the leader must call finish(); everyone else waits on flight.done and reads flight.reply.
+        """
+        slot = (key, normalize(user_input))
+        with self.lock:
+            flight = self.in_flight.get(slot)
+            if flight:
+                self.collapsed += 1
+                return flight, False
+            flight = self.in_flight[slot] = InFlight()
+            self.misses += 1
+            return flight, True
+
+    def finish(self, key, user_input, flight, reply=None):
+        """Stores the leader's reply (None if it failed or had side effects) and releases any waiters."""
+        if reply is not None:
+            self.put(key, user_input, reply)
+        with self.lock:
+            self.in_flight.pop((key, normalize(user_input)), None)
+        flight.reply = reply
+        flight.done.set()
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "similar_hits": self.similar_hits,
+                    "collapsed": self.collapsed, "misses": self.misses}
@@ -0,0 +1,82 @@
+import threading
+from collections import deque
+
+class ChatRequest:
+    """One user message waiting for a worker."""
+
+    def __init__(self, request_id, text, use_veo=False, stream=True, lane=None, character=None, handle=None):
+        self.request_id = request_id
+        self.text = text
+        self.use_veo = use_veo
+        self.stream = stream
+        self.lane = lane           # Requests sharing a lane (chat session) run strictly in order
+        self.character = character # Character the message was typed to, whatever is selected when it runs
+        self.handle = handle       # AIModel.open_session() handle the turn is sent on
+        self.merged_ids = []       # Ids of earlier messages folded into this turn
+
+    def bind(self, handle):
+        # The session key is the lane, so two workers never send on one ChatSession at once
+        self.handle = handle
+        self.lane = handle[3]
+
+    def merge(self, newer):
+        # Messages typed while this one was still waiting are sent as a single turn
+        self.text = f"{self.text}\n{newer.text}"
+        self.merged_ids.append(self.request_id)
+        self.request_id = newer.request_id
+        self.use_veo = newer.use_veo
+        self.stream = newer.stream
+
+class RequestQueue:
+    """
+    Work queue shared by the long-lived worker threads.
+    Each lane is served by at most one worker at a time, so turns on a chat session never overlap,
+    while different lanes (and lane=None work) run in parallel up to the number of workers.
+    """
+
+    def __init__(self, coalesce=True):
+        self.coalesce = coalesce
+        self.cond = threading.Condition()
+        self.pending = deque()   # Arrival order across all lanes
+        self.busy_lanes = set()
+        self.closed = False
+
+    def put(self, request):
+        with self.cond:
+            if self.coalesce and request.lane is not None:
+                # Fold into a not-yet-started request on the same lane instead of queueing another turn
+                for waiting in reversed(self.pending):
+                    if waiting.lane == request.lane:
+                        waiting.merge(request)
+                        return len(self.pending)
+            self.pending.append(request)
+            self.cond.notify()
+            return len(self.pending)
+
+    def take(self):
+        """Blocks until a request whose lane is free is available. Returns None once closed."""
+        with self.cond:
+            while True:
+                if self.closed:
+                    return None
+                for request in self.pending:
+                    if request.lane is None or request.lane not in self.busy_lanes:
+                        self.pending.remove(request)
+                        if request.lane is not None:
+                            self.busy_lanes.add(request.lane)
+                        return request
+                self.cond.wait()
+
+    def done(self, request):
+        with self.cond:
+            self.busy_lanes.discard(request.lane)
+            self.cond.notify_all()
+
+    def depth(self):
+        with self.cond:
+            return len(self.pending)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
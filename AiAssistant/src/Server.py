@@ -0,0 +1,520 @@
+"""
+Headless HTTP/WebSocket API so one backend can drive several kiosk screens.
+Every session has its own chat history, animation choice and Veo jobs; all of them share one AIModel.
+
+Usage (from the AiAssistant folder):
+    python -m src.Main --server --port 8765
+
+HTTP (JSON bodies):
+    GET  /characters
+    POST /sessions                          {"character": "Wizard", "session": "kiosk-1"} (both optional)
+    POST /sessions/<id>/character           {"character": "Wizard"}
+    POST /sessions/<id>/chat                {"text": "Hello", "veo": false}
+    GET  /sessions/<id>/videos/<request id> generated clip for a reply (404 until ready)
+    GET  /clips/<character>/<animation>     pre-canned clip
+
+WebSocket /sessions/<id>/ws:
+    send    {"type": "chat", "text": "Hello", "veo": true} or {"type": "character", "character": "Wizard"}
+    receive {"type": "chunk", ...}, {"type": "reply", ...}, {"type": "video", ...}, {"type": "error", ...}
+    Veo starts from the reply's first sentence, so a cached clip's "video" message can arrive before its "reply".
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import secrets
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote, urlsplit
+from src.Tools import begin_animation_choice
+from src.VeoScheduler import VeoScheduler, construct_veo_prompt, veo_prompt_settled
+from src.Tracing import tracer
+
+MAX_BODY = 1024 * 1024
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+STATUS_TEXT = {200: "OK", 206: "Partial Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 416: "Range Not Satisfiable", 500: "Internal Server Error"}
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class HttpRequest:
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HttpError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HttpError(400, "Body must be a JSON object")
+        return data
+
+async def read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY:
+        raise HttpError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return HttpRequest(method.upper(), unquote(urlsplit(target).path), headers, body)
+
+class WebSocket:
+    """Minimal RFC 6455 connection: text messages, ping/pong and close."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.send_lock = asyncio.Lock()
+        self.closed = False
+
+    async def receive(self):
+        """Next text message, or None once the client has gone."""
+        message = b""
+        try:
+            while True:
+                head = await self.reader.readexactly(2)
+                fin, opcode = head[0] & 0x80, head[0] & 0x0F
+                masked, length = head[1] & 0x80, head[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+                if length + len(message) > MAX_BODY:
+                    await self.close(1009)
+                    return None
+                mask = await self.reader.readexactly(4) if masked else b""
+                payload = await self.reader.readexactly(length)
+                if masked and length:
+                    # XOR the whole payload at once instead of byte by byte
+                    key = (mask * (length // 4 + 1))[:length]
+                    payload = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+
+                if opcode == 0x8:
+                    await self.close()
+                    return None
+                if opcode == 0x9:
+                    await self.send_frame(0xA, payload)
+                    continue
+                if opcode == 0xA:
+                    continue
+                message += payload
+                if fin:
+                    return message.decode("utf-8", errors="replace")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.closed = True
+            return None
+
+    async def send_frame(self, opcode, payload):
+        if self.closed:
+            return
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        async with self.send_lock:
+            try:
+                self.writer.write(header + payload)
+                await self.writer.drain()
+            except ConnectionError:
+                self.closed = True
+
+    async def send_json(self, data):
+        await self.send_frame(0x1, json.dumps(data).encode("utf-8"))
+
+    async def close(self, code=1000):
+        await self.send_frame(0x8, struct.pack("!H", code))
+        self.closed = True
+
+class ServerSession:
+    """One kiosk's conversation: its character, reply counter, generated clips and open sockets."""
+
+    def __init__(self, sid, character):
+        self.sid = sid
+        self.character = character
+        self.lock = asyncio.Lock()  # One turn at a time per session, like a RequestQueue lane
+        self.request_id = 0
+        self.videos = {}            # request id -> generated clip path, newest few only
+        self.sockets = set()
+        self.last_used = time.monotonic()
+
+    def chat_key(self):
+        # Model session pool and conversation store key: the same character on two kiosks keeps two histories
+        return f"{self.character}@{self.sid}"
+
+class AssistantServer:
+    ROUTES = [
+        ("GET", r"/characters", "get_characters"),
+        ("POST", r"/sessions", "create_session"),
+        ("POST", r"/sessions/([^/]+)/character", "set_character"),
+        ("POST", r"/sessions/([^/]+)/chat", "post_chat"),
+        ("GET", r"/sessions/([^/]+)/videos/(\d+)", "get_video"),
+        ("GET", r"/clips/([^/]+)/([^/]+)", "get_clip"),
+    ]
+
+    def __init__(self, model, registry, host="127.0.0.1", port=8765, workers=8, max_sessions=64,
+                 session_ttl=3600, clip_match_threshold=0.5, videos_kept=5):
+        self.model = model
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.sessions = {}       # id -> ServerSession
+        self.session_ttl = session_ttl
+        self.videos_kept = videos_kept
+        self.clip_match_threshold = clip_match_threshold
+        self.veo_scheduler = None
+        self.loop = None
+        self.server = None
+        # Chat turns block on the SDK, so they run here rather than on the event loop
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="server-chat")
+        # Room for every live session's chat in the model's pool
+        model.max_sessions = max(model.max_sessions, max_sessions)
+
+    # --- Lifecycle ---------------------------------------------------------------------------------
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    def start_in_thread(self):
+        thread = threading.Thread(target=self.run, name="AssistantServer", daemon=True)
+        thread.start()
+        return thread
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.registry.refresh()
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        print(f"Assistant server listening on http://{self.host}:{self.port}")
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            if self.veo_scheduler:
+                self.veo_scheduler.shutdown()
+            self.pool.shutdown(wait=False)
+
+    # --- HTTP --------------------------------------------------------------------------------------
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = None
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    match = re.fullmatch(r"/sessions/([^/]+)/ws", request.path)
+                    if match and request.headers.get("upgrade", "").lower() == "websocket":
+                        await self.handle_websocket(request, reader, writer, self.get_session(match.group(1)))
+                        break
+                    status, body, headers = await self.route(request)
+                except HttpError as e:
+                    status, body, headers = e.status, {"error": str(e)}, {}
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    print(f"Server error: {e}")
+                    status, body, headers = 500, {"error": str(e)}, {}
+
+                await self.send_response(writer, status, body, headers)
+                if request is None or request.headers.get("connection", "").lower() == "close":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, request):
+        allowed = False
+        for method, pattern, handler in self.ROUTES:
+            match = re.fullmatch(pattern, request.path)
+            if match:
+                allowed = True
+                if method == request.method:
+                    return await getattr(self, handler)(request, *match.groups())
+        raise HttpError(405 if allowed else 404, f"No route for {request.method} {request.path}")
+
+    async def send_response(self, writer, status, body, headers=None):
+        headers = dict(headers or {})
+        if isinstance(body, (bytes, bytearray)):
+            payload = bytes(body)
+        else:
+            payload = json.dumps(body).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        headers["Content-Length"] = str(len(payload))
+        head = f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n"
+        writer.write(head.encode("latin-1") + payload)
+        await writer.drain()
+
+    async def file_response(self, request, path):
+        """Serves a clip, honouring a single byte Range so video players can seek."""
+        if not path or not os.path.isfile(path):
+            raise HttpError(404, "Clip not found")
+        size = os.path.getsize(path)
+        start, end, status = 0, size - 1, 200
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", request.headers.get("range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start > end:
+                raise HttpError(416, "Range not satisfiable")
+            status = 206
+
+        def read():
+            with open(path, "rb") as f:
+                f.seek(start)
+                return f.read(end - start + 1)
+
+        data = await self.loop.run_in_executor(None, read)
+        headers = {"Content-Type": "video/mp4", "Accept-Ranges": "bytes"}
+        if status == 206:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return status, data, headers
+
+    # --- Routes ------------------------------------------------------------------------------------
+
+    async def get_characters(self, request):
+        self.registry.refresh()
+        return 200, {"characters": self.registry.names()}, {}
+
+    async def create_session(self, request):
+        data = request.json()
+        self.expire_sessions()
+        sid = str(data.get("session") or secrets.token_urlsafe(8))
+        session = self.sessions.get(sid)
+        if session is None:
+            names = self.registry.names()
+            session = ServerSession(sid, data.get("character") or (names[0] if names else None))
+            self.sessions[sid] = session
+        elif data.get("character"):
+            session.character = data["character"]
+        self.check_character(session.character)
+        return 200, {"session": sid, "character": session.character}, {}
+
+    async def set_character(self, request, sid):
+        session = self.get_session(sid)
+        character = request.json().get("character")
+        self.check_character(character)
+        session.character = character
+        return 200, {"session": sid, "character": character}, {}
+
+    async def post_chat(self, request, sid):
+        data = request.json()
+        text = data.get("text")
+        if not isinstance(text, str) or not text.strip():
+            raise HttpError(400, "'text' is required")
+        return 200, await self.chat(self.get_session(sid), text, bool(data.get("veo"))), {}
+
+    async def get_video(self, request, sid, request_id):
+        return await self.file_response(request, self.get_session(sid).videos.get(int(request_id)))
+
+    async def get_clip(self, request, character, animation):
+        record = self.registry.get(character)
+        if not record:
+            raise HttpError(404, f"Unknown character {character}")
+        return await self.file_response(request, record.animation_path(os.path.splitext(animation)[0]))
+
+    # --- Sessions ----------------------------------------------------------------------------------
+
+    def get_session(self, sid):
+        session = self.sessions.get(sid)
+        if session is None:
+            raise HttpError(404, f"Unknown session {sid}")
+        session.last_used = time.monotonic()
+        return session
+
+    def check_character(self, character):
+        if not character or not self.registry.get(character):
+            self.registry.refresh() # May have been added since the last scan
+        if not character or not self.registry.get(character):
+            raise HttpError(404, f"Unknown character {character}")
+
+    def expire_sessions(self):
+        # Idle sessions are dropped; their history stays in the conversation store and resumes on return
+        cutoff = time.monotonic() - self.session_ttl
+        for sid, session in list(self.sessions.items()):
+            if session.last_used < cutoff and not session.sockets and not session.lock.locked():
+                del self.sessions[sid]
+
+    # --- Chat --------------------------------------------------------------------------------------
+
+    async def chat(self, session, text, use_veo=False):
+        """Runs one turn. Chunks, the reply and (later) the generated clip are also pushed to the session's sockets."""
+        record = self.registry.get(session.character)
+        if not record:
+            raise HttpError(404, f"Unknown character {session.character}")
+
+        async with session.lock:
+            session.request_id += 1
+            request_id = session.request_id
+            if self.veo_scheduler:
+                self.veo_scheduler.supersede(request_id, owner=session.sid)
+
+            loop = self.loop
+            chunks = asyncio.Queue()
+
+            def turn():
+                # Runs on a pool thread: the AnimationChoice lives in this thread's context only
+                choice = begin_animation_choice()
+                try:
+                    with tracer.context(character=record.name, request_id=request_id, session=session.sid):
+                        handle = self.model.open_session(record.prompt_for(self.model.tools, override_only=True), session.chat_key())
+                        for chunk in self.model.chat_stream(text, handle=handle):
+                            loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+                finally:
+                    loop.call_soon_threadsafe(chunks.put_nowait, None)
+                return choice.name
+
+            future = loop.run_in_executor(self.pool, turn)
+            text_so_far = ""
+            video_started, video = False, None
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                text_so_far += chunk
+                await self.broadcast(session, {"type": "chunk", "request_id": request_id, "text": chunk})
+                # The Veo prompt only uses the first sentence; start the clip as soon as it is settled
+                if use_veo and not video_started and veo_prompt_settled(text_so_far):
+                    video = self.request_video(session, record, request_id, text_so_far)
+                    video_started = True
+            tool_animation = await future
+
+        reply = text_so_far or "(Action executed)"
+        if use_veo and not video_started:
+            video = self.request_video(session, record, request_id, reply)
+        animation = record.choose_animation(reply, tool_animation)
+
+        result = {
+            "type": "reply", "session": session.sid, "request_id": request_id, "reply": reply,
+            "animation": animation,
+            "clip": self.clip_url(record.name, animation) if record.animation_path(animation) else None,
+        }
+        if use_veo:
+            result["video"] = video
+        await self.broadcast(session, result)
+        return result
+
+    def clip_url(self, character, animation):
+        return f"/clips/{quote(character)}/{quote(animation)}"
+
+    def video_url(self, session, request_id):
+        return f"/sessions/{quote(session.sid)}/videos/{request_id}"
+
+    def request_video(self, session, record, request_id, reply):
+        """URL of a pre-rendered match, or None while a live generation runs (announced later as a "video" message)."""
+        if not record.idle_path:
+            return None
+        clip_path, _ = record.clip_library(self.clip_match_threshold).match(reply)
+        if clip_path:
+            self.store_video(session, request_id, clip_path)
+            return self.video_url(session, request_id)
+
+        if self.veo_scheduler is None:
+            self.veo_scheduler = VeoScheduler(self.model)
+        loop = self.loop
+        self.veo_scheduler.submit(construct_veo_prompt(reply), record.idle_path, record.name, request_id,
+                                  on_done=lambda job: loop.call_soon_threadsafe(self.video_done, session, job),
+                                  owner=session.sid)
+        return None
+
+    def video_done(self, session, job):
+        if job.result_path:
+            self.store_video(session, job.request_id, job.result_path)
+            message = {"type": "video", "request_id": job.request_id, "clip": self.video_url(session, job.request_id)}
+        else:
+            message = {"type": "error", "request_id": job.request_id, "error": job.error}
+        self.loop.create_task(self.broadcast(session, message))
+
+    def store_video(self, session, request_id, path):
+        session.videos[request_id] = path
+        for old in sorted(session.videos)[:-self.videos_kept]:
+            del session.videos[old]
+
+    async def broadcast(self, session, message):
+        for socket in list(session.sockets):
+            await socket.send_json(message)
+
+    # --- WebSocket ---------------------------------------------------------------------------------
+
+    async def handle_websocket(self, request, reader, writer, session):
+        key = request.headers.get("sec-websocket-key")
+        if not key:
+            raise HttpError(400, "Missing Sec-WebSocket-Key")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("latin-1")).digest()).decode("latin-1")
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        socket = WebSocket(reader, writer)
+        session.sockets.add(socket)
+        tasks = set()
+        try:
+            while True:
+                message = await socket.receive()
+                if message is None:
+                    break
+                session.last_used = time.monotonic()
+                # Turns run as tasks so pings and further messages are still read while a reply streams
+                task = asyncio.create_task(self.handle_socket_message(session, socket, message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            session.sockets.discard(socket)
+
+    async def handle_socket_message(self, session, socket, message):
+        try:
+            try:
+                data = json.loads(message)
+            except ValueError:
+                raise HttpError(400, "Message is not valid JSON")
+            if not isinstance(data, dict):
+                raise HttpError(400, "Message must be a JSON object")
+
+            if data.get("type") == "chat":
+                text = data.get("text")
+                if not isinstance(text, str) or not text.strip():
+                    raise HttpError(400, "'text' is required")
+                await self.chat(session, text, bool(data.get("veo")))
+            elif data.get("type") == "character":
+                self.check_character(data.get("character"))
+                session.character = data["character"]
+                await socket.send_json({"type": "character", "character": session.character})
+            else:
+                raise HttpError(400, f"Unknown message type {data.get('type')}")
+        except HttpError as e:
+            await socket.send_json({"type": "error", "error": str(e)})
+        except Exception as e:
+            print(f"Server error: {e}")
+            await socket.send_json({"type": "error", "error": str(e)})
@@ -0,0 +1,61 @@
+import math
+import re
+from collections import Counter
+
+STOP_WORDS = {
+    "a", "an", "the", "and", "or", "but", "is", "are", "was", "were", "be", "to", "of", "in", "on", "at",
+    "for", "with", "it", "this", "that", "i", "you", "me", "my", "your", "we", "so", "do", "as", "by",
+}
+
+def tokenize(text):
+    return [word for word in re.findall(r"[a-z0-9']+", text.lower()) if word not in STOP_WORDS]
+
+class TfidfIndex:
+    """
+    Small TF-IDF nearest-neighbour index over short texts.
+    Vectors are sparse and L2-normalised, and queries walk an inverted index,
+    so only documents sharing a term with the query are scored.
+    """
+
+    def __init__(self):
+        self.docs = {}      # doc id -> text
+        self.vectors = {}   # doc id -> {term: weight}
+        self.postings = {}  # term -> {doc id: weight}
+        self.idf = {}
+
+    def add(self, doc_id, text):
+        self.docs[doc_id] = text
+
+    def build(self):
+        counts = {doc_id: Counter(tokenize(text)) for doc_id, text in self.docs.items()}
+        doc_freq = Counter()
+        for terms in counts.values():
+            doc_freq.update(terms.keys())
+
+        n = len(counts)
+        # Smoothed idf keeps terms found in every document slightly positive
+        self.idf = {term: math.log((1 + n) / (1 + df)) + 1 for term, df in doc_freq.items()}
+        self.vectors = {doc_id: self.vectorize_counts(terms) for doc_id, terms in counts.items()}
+
+        self.postings = {}
+        for doc_id, vector in self.vectors.items():
+            for term, weight in vector.items():
+                self.postings.setdefault(term, {})[doc_id] = weight
+
+    def vectorize(self, text):
+        return self.vectorize_counts(Counter(tokenize(text)))
+
+    def vectorize_counts(self, counts):
+        vector = {term: (1 + math.log(tf)) * self.idf.get(term, 0.0) for term, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        if not norm:
+            return {}
+        return {term: w / norm for term, w in vector.items() if w}
+
+    def query(self, text, k=1):
+        """Returns up to k (doc id, cosine similarity) pairs, best first."""
+        scores = Counter()
+        for term, weight in self.vectorize(text).items():
+            for doc_id, doc_weight in self.postings.get(term, {}).items():
+                scores[doc_id] += weight * doc_weight
+        return scores.most_common(k)
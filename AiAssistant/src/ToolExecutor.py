@@ -0,0 +1,134 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from src.Tracing import tracer
+
+class ToolSpec:
+    def __init__(self, func, timeout, max_output, blocking=False):
+        self.func = func
+        self.name = func.__name__
+        self.timeout = timeout
+        self.max_output = max_output
+        self.blocking = blocking # Runs on its own pool so a hung call cannot starve the quick tools
+
+class ToolExecutor:
+    """
+    Registry of the tools the model may call, run on a shared thread pool.
+    All function calls from one model turn run in parallel; each one is bounded by its own timeout
+    and output size, and its timing is recorded per tool.
+    A tool that overruns its timeout is reported to the model as an error; its thread finishes in the background
+    and keeps its pool slot until then, which stats() reports as "stuck".
+    Tools named in `blocking` (file and process calls that can hang) run on a separate, larger pool.
+    """
+
+    def __init__(self, tools=(), timeouts=None, default_timeout=10.0, max_output=4000, max_workers=4,
+                 blocking=None, blocking_workers=16):
+        self.default_timeout = default_timeout
+        self.max_output = max_output
+        self.timeouts = timeouts or {}
+        self.blocking = set(blocking or ())
+        self.specs = {} # name -> ToolSpec
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self.blocking_pool = ThreadPoolExecutor(max_workers=blocking_workers, thread_name_prefix="tool-blocking")
+        self.lock = threading.Lock()
+        self.timings = {} # name -> {"count", "total", "max", "timeouts", "errors"}
+        self.running = {} # abandoned Event -> tool name, for every call currently holding a thread
+        self.set_tools(tools)
+
+    def register(self, func, timeout=None, max_output=None):
+        timeout = timeout or self.timeouts.get(func.__name__, self.default_timeout)
+        self.specs[func.__name__] = ToolSpec(func, timeout, max_output or self.max_output, func.__name__ in self.blocking)
+
+    def set_tools(self, tools):
+        self.specs = {}
+        for func in tools:
+            self.register(func)
+
+    def run(self, calls):
+        """Runs (name, args) pairs concurrently. Returns their results as strings, in call order."""
+        context = tracer.current()
+        started = time.perf_counter()
+        # Each call runs in a copy of the caller's contextvars, so tools see this request's AnimationChoice
+        abandoned = [threading.Event() for _ in calls]
+        futures = [self.pool_for(name).submit(contextvars.copy_context().run, self.invoke, name, args, context, gave_up)
+                   for (name, args), gave_up in zip(calls, abandoned)]
+
+        results = []
+        for (name, _), future, gave_up in zip(calls, futures, abandoned):
+            # Each call gets its own budget measured from the start of the batch
+            remaining = self.spec_timeout(name) - (time.perf_counter() - started)
+            try:
+                results.append(future.result(timeout=max(0, remaining)))
+            except FutureTimeout:
+                future.cancel()
+                with self.lock:
+                    gave_up.set() # Its thread may still finish; that run was already counted as a timeout
+                self.record(name, self.spec_timeout(name), timed_out=True)
+                results.append(f"Error: {name} timed out after {self.spec_timeout(name):g}s")
+        return results
+
+    def pool_for(self, name):
+        spec = self.specs.get(name)
+        return self.blocking_pool if spec and spec.blocking else self.pool
+
+    def spec_timeout(self, name):
+        spec = self.specs.get(name)
+        return spec.timeout if spec else self.default_timeout
+
+    def invoke(self, name, args, context, abandoned=None):
+        spec = self.specs.get(name)
+        if spec is None:
+            return f"Error: Unknown tool {name}"
+
+        abandoned = abandoned or threading.Event()
+        with self.lock:
+            self.running[abandoned] = name
+        start = time.perf_counter()
+        failed = False
+        try:
+            with tracer.context(**context), tracer.span(f"tool:{name}") as span:
+                try:
+                    result = str(spec.func(**args))
+                except Exception as e:
+                    failed = True
+                    result = f"Error running {name}: {str(e)}"
+                if len(result) > spec.max_output:
+                    span.set(truncated=len(result))
+                    result = result[:spec.max_output] + f"... [truncated {len(result) - spec.max_output} characters]"
+            self.record(name, time.perf_counter() - start, failed=failed, abandoned=abandoned)
+        finally:
+            with self.lock:
+                self.running.pop(abandoned, None)
+        return result
+
+    def record(self, name, seconds, failed=False, timed_out=False, abandoned=None):
+        with self.lock:
+            if abandoned is not None and abandoned.is_set():
+                return
+            timing = self.timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0, "timeouts": 0, "errors": 0})
+            if timed_out:
+                timing["timeouts"] += 1
+                return
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+            timing["errors"] += int(failed)
+
+    def stats(self):
+        """
+        Per-tool call count, mean/max seconds, timeouts and errors, plus "stuck":
+        timed-out calls whose threads are still running and unavailable to new calls.
+        """
+        with self.lock:
+            stuck = {}
+            for gave_up, name in self.running.items():
+                if gave_up.is_set():
+                    stuck[name] = stuck.get(name, 0) + 1
+            return {name: {**timing, "mean": timing["total"] / timing["count"] if timing["count"] else 0.0,
+                           "stuck": stuck.get(name, 0)}
+                    for name, timing in self.timings.items()}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.blocking_pool.shutdown(wait=False, cancel_futures=True)
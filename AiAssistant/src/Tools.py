@@ -1,11 +1,72 @@
 import platform
 import os
 import subprocess 
+import ast
+import operator
+from contextvars import ContextVar
+from functools import lru_cache
+
+class AnimationChoice:
+    """Mutable holder for the animation set_animation picked during one request."""
+
+    def __init__(self):
+        self.name = None
+
+# Each request installs its own holder, so concurrent sessions never see each other's choice
+current_animation = ContextVar("current_animation", default=None)
+
+def begin_animation_choice():
+    choice = AnimationChoice()
+    current_animation.set(choice)
+    return choice
+
+# Operators calculate() understands; anything else in an expression is rejected
+BINARY_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+}
+UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+MAX_EXPONENT = 1000
+MAX_RESULT_BITS = 10000 # ~3000 digits; checked before the work is done, since a huge pow cannot be interrupted
+
+@lru_cache(maxsize=256)
+def compile_expression(expression):
+    """Parses and validates an arithmetic expression once; repeated expressions reuse the checked tree."""
+    tree = ast.parse(expression.strip(), mode="eval")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant):
+            if type(node.value) not in (int, float):
+                raise ValueError("only numbers are allowed")
+        elif isinstance(node, ast.BinOp):
+            if type(node.op) not in BINARY_OPS:
+                raise ValueError(f"operator {type(node.op).__name__} is not allowed")
+        elif isinstance(node, ast.UnaryOp):
+            if type(node.op) not in UNARY_OPS:
+                raise ValueError(f"operator {type(node.op).__name__} is not allowed")
+        elif not isinstance(node, (ast.Expression, ast.operator, ast.unaryop)):
+            raise ValueError(f"{type(node).__name__} is not allowed")
+    return tree.body
+
+def evaluate(node):
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.UnaryOp):
+        return UNARY_OPS[type(node.op)](evaluate(node.operand))
+    left, right = evaluate(node.left), evaluate(node.right)
+    if isinstance(node.op, ast.Pow) and abs(right) > MAX_EXPONENT:
+        raise ValueError("exponent too large")
+    if type(left) is int and type(right) is int:
+        # Float results overflow on their own; integers would just keep growing
+        if isinstance(node.op, ast.Pow) and right > 0 and abs(left).bit_length() * right > MAX_RESULT_BITS:
+            raise ValueError("result too large")
+        if isinstance(node.op, ast.Mult) and abs(left).bit_length() + abs(right).bit_length() > MAX_RESULT_BITS:
+            raise ValueError("result too large")
+    result = BINARY_OPS[type(node.op)](left, right)
+    if isinstance(result, complex):
+        raise ValueError("result is not a real number") # e.g. a negative number to a fractional power
+    return result
 
 class ToolKit:
-    
-    # Default fallback
-    selected_animation = "default"
 
     def set_animation(animation_name: str):
         """
@@ -16,7 +77,9 @@ class ToolKit:
         # We accept whatever the AI sends. Validation happens in Controller.
         # We strip whitespace and lowercase it to be safe.
         clean_name = animation_name.strip().lower()
-        ToolKit.selected_animation = clean_name
+        choice = current_animation.get()
+        if choice is not None:
+            choice.name = clean_name
         return f"Animation requested: {clean_name}"
 
     def get_system_info():
@@ -32,11 +95,9 @@ class ToolKit:
 
     def calculate(expression: str):
         try:
-            allowed_chars = "0123456789+-*/(). "
-            if any(c not in allowed_chars for c in expression):
-                return "Error: Unsafe characters detected."
-            print (expression)
-            return str(eval(expression))
+            return str(evaluate(compile_expression(expression)))
+        except SyntaxError:
+            return "Math Error: invalid expression"
         except Exception as e:
             return f"Math Error: {str(e)}"
 
@@ -59,4 +120,13 @@ class ToolKit:
         except Exception as e:
             return f"Failed to open {app_name}. Error: {e}"
 
-    tools_list = [get_system_info, create_file, calculate, open_application, set_animation]
\ No newline at end of file
+    tools_list = [get_system_info, create_file, calculate, open_application, set_animation]
+
+    # Seconds each tool may run before the model is told it timed out (ToolExecutor default otherwise)
+    timeouts = {"get_system_info": 2, "calculate": 2, "create_file": 5, "open_application": 5, "set_animation": 1}
+
+    # Tools that wait on the OS (disk, process launch) and can hang; they get their own threads
+    blocking = {"create_file", "open_application"}
+
+    # Used when animations are picked locally by AnimationSelector, saving the model a tool round-trip
+    local_animation_tools_list = [get_system_info, create_file, calculate, open_application]
\ No newline at end of file
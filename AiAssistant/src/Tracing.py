@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+class Span:
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, **attrs):
+        if self.duration is not None:
+            return # Already ended
+        self.attrs.update(attrs)
+        self.duration = time.perf_counter() - self.start
+        self.tracer.finish(self)
+
+class Tracer:
+    """
+    Records timed spans for each stage of a reply (submit, send_message, tools, Veo, download, playback).
+    Finished spans are appended to a JSON-lines file and folded into per-stage histograms.
+    Character and request IDs set with context() are attached to every span started on that thread.
+    """
+
+    # Histogram bucket upper bounds, in seconds
+    BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.histograms = {} # span name -> {"count", "sum", "buckets"}
+        self.listeners = []  # Called with each finished span (e.g. the view's latency overlay)
+
+    def set_output(self, path):
+        self.path = path
+
+    @contextmanager
+    def context(self, **attrs):
+        """Attaches attrs (character, request_id, ...) to spans started on this thread inside the block."""
+        previous = getattr(self.local, "attrs", {})
+        self.local.attrs = {**previous, **attrs}
+        try:
+            yield
+        finally:
+            self.local.attrs = previous
+
+    def current(self):
+        """This thread's context attrs, for handing work to another thread."""
+        return dict(getattr(self.local, "attrs", {}))
+
+    def start(self, name, **attrs):
+        """Starts a span that is ended later with span.end(), possibly from another thread."""
+        return Span(self, name, {**getattr(self.local, "attrs", {}), **attrs})
+
+    @contextmanager
+    def span(self, name, **attrs):
+        span = self.start(name, **attrs)
+        try:
+            yield span
+        except Exception as e:
+            span.set(error=str(e))
+            raise
+        finally:
+            span.end()
+
+    def finish(self, span):
+        record = {"name": span.name, "start": span.wall_start, "duration": span.duration, **span.attrs}
+        with self.lock:
+            hist = self.histograms.setdefault(span.name, {"count": 0, "sum": 0.0, "buckets": [0] * (len(self.BUCKETS) + 1)})
+            hist["count"] += 1
+            hist["sum"] += span.duration
+            hist["buckets"][self.bucket_index(span.duration)] += 1
+            if self.path:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record, default=str) + "\n")
+                except OSError as e:
+                    print(f"Could not write trace: {e}")
+        for listener in list(self.listeners):
+            listener(record)
+
+    def bucket_index(self, seconds):
+        for i, bound in enumerate(self.BUCKETS):
+            if seconds <= bound:
+                return i
+        return len(self.BUCKETS)
+
+    def summary(self):
+        """Per-stage count, mean and approximate p50/p95 (bucket upper bounds)."""
+        with self.lock:
+            result = {}
+            for name, hist in self.histograms.items():
+                result[name] = {
+                    "count": hist["count"],
+                    "mean": hist["sum"] / hist["count"],
+                    "p50": self.quantile(hist, 0.5),
+                    "p95": self.quantile(hist, 0.95),
+                    "buckets": dict(zip([str(b) for b in self.BUCKETS] + ["+inf"], hist["buckets"])),
+                }
+            return result
+
+    def quantile(self, hist, q):
+        target = q * hist["count"]
+        seen = 0
+        for i, count in enumerate(hist["buckets"]):
+            seen += count
+            if seen >= target:
+                return self.BUCKETS[i] if i < len(self.BUCKETS) else float("inf")
+        return float("inf")
+
+    def dump(self, path):
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        os.replace(path + ".tmp", path)
+
+# Shared by Model, Controller and View
+tracer = Tracer()
@@ -0,0 +1,133 @@
+import html
+import json
+import tempfile
+from collections import OrderedDict
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QSize, Qt
+from PyQt6.QtGui import QTextDocument
+from PyQt6.QtWidgets import QStyledItemDelegate, QStyle
+
+class TranscriptModel(QAbstractListModel):
+    """
+    Chat messages for a QListView, with at most max_messages held in memory.
+    Messages pushed out of memory are paged to a temp file and can be read back with load_older().
+
+    Rows cover messages [first, first + len(messages)); the first len(offsets) messages are also on disk.
+    """
+
+    def __init__(self, max_messages=200, page_size=50):
+        super().__init__()
+        self.max_messages = max_messages
+        self.page_size = page_size
+        self.messages = []   # [speaker, text] pairs currently in memory
+        self.first = 0       # Absolute index of self.messages[0]
+        self.offsets = []    # Byte offset in the spill file of every message on disk
+        self.spill = tempfile.TemporaryFile(mode="w+b")
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.messages)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        speaker, text = self.messages[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{speaker}: {text}"
+        if role == Qt.ItemDataRole.UserRole:
+            return f"<b>{html.escape(speaker)}:</b> {html.escape(text).replace(chr(10), '<br>')}"
+        return None
+
+    def append_message(self, speaker, text, trim=True):
+        """Adds a message at the bottom. Returns its absolute position, which stays valid across trim/load_older."""
+        # trim=False leaves paged-in history alone while the user is reading it
+        row = len(self.messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.messages.append([speaker, text])
+        self.endInsertRows()
+        position = self.first + row
+        if trim:
+            self.trim()
+        return position
+
+    def append_to_message(self, position, text):
+        """Grows the message at an absolute position in place (streamed replies), wherever it now sits."""
+        row = position - self.first
+        if not 0 <= row < len(self.messages):
+            return # Already paged out; a reply would need max_messages newer rows while streaming for this
+        self.messages[row][1] += text
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.UserRole])
+
+    def trim(self):
+        excess = len(self.messages) - self.max_messages
+        if excess <= 0:
+            return
+        # Write out anything that has never been on disk before dropping it from memory
+        for i in range(excess):
+            if self.first + i >= len(self.offsets):
+                self.write_message(self.messages[i])
+        self.beginRemoveRows(QModelIndex(), 0, excess - 1)
+        del self.messages[:excess]
+        self.first += excess
+        self.endRemoveRows()
+
+    def write_message(self, message):
+        self.spill.seek(0, 2)
+        self.offsets.append(self.spill.tell())
+        self.spill.write(json.dumps(message).encode("utf-8") + b"\n")
+
+    def can_load_older(self):
+        return self.first > 0
+
+    def load_older(self):
+        """Reads the previous page back from disk. Returns the number of rows inserted at the top."""
+        if not self.first:
+            return 0
+        start = max(0, self.first - self.page_size)
+        self.spill.seek(self.offsets[start])
+        older = [json.loads(self.spill.readline()) for _ in range(self.first - start)]
+
+        self.beginInsertRows(QModelIndex(), 0, len(older) - 1)
+        self.messages[:0] = older
+        self.first = start
+        self.endInsertRows()
+        return len(older)
+
+    def close(self):
+        self.spill.close()
+
+class MessageDelegate(QStyledItemDelegate):
+    """Draws each message as rich text, caching row heights per width."""
+
+    def __init__(self, parent=None, cache_size=512):
+        super().__init__(parent)
+        self.heights = OrderedDict() # (html, width) -> height
+        self.cache_size = cache_size
+
+    def document(self, option, index):
+        doc = QTextDocument()
+        doc.setDefaultFont(option.font)
+        doc.setDefaultStyleSheet("body { color: #e0e0e0; } b { color: #ffffff; }")
+        doc.setHtml(index.data(Qt.ItemDataRole.UserRole))
+        doc.setTextWidth(max(50, option.rect.width()))
+        return doc
+
+    def paint(self, painter, option, index):
+        self.initStyleOption(option, index)
+        painter.save()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        painter.translate(option.rect.topLeft())
+        self.document(option, index).drawContents(painter)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        key = (index.data(Qt.ItemDataRole.UserRole), option.rect.width())
+        height = self.heights.get(key)
+        if height is None:
+            height = int(self.document(option, index).size().height()) + 6
+            self.heights[key] = height
+            if len(self.heights) > self.cache_size:
+                self.heights.popitem(last=False)
+        else:
+            self.heights.move_to_end(key)
+        return QSize(option.rect.width(), height)
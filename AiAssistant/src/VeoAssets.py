@@ -0,0 +1,79 @@
+import os
+import threading
+
+class FrameAsset:
+    """A character's reference frame, read and prepared once per file version."""
+
+    def __init__(self, path, signature, raw_bytes, data, mime_type):
+        self.path = path
+        self.signature = signature # (mtime, size) of the file it was read from
+        self.raw_bytes = raw_bytes # Original file, still used for clip cache keys
+        self.data = data           # Bytes actually sent to Veo (downscaled when possible)
+        self.mime_type = mime_type
+
+class VeoAssets:
+    """
+    Everything a Veo request needs that does not change between generations:
+    one client per API key, and each character's reference frame scaled to Veo's native resolution.
+    Frames are sent inline; the Gemini API only takes file references (gcs_uri) in Vertex AI mode.
+    """
+
+    NATIVE_SIZE = (720, 1280) # 9:16 at 720p
+
+    def __init__(self, native_size=NATIVE_SIZE):
+        self.native_size = native_size
+        self.lock = threading.Lock()
+        self.clients = {} # api key -> genai.Client
+        self.frames = {}  # image path -> FrameAsset
+
+    def client(self, genai, api_key):
+        with self.lock:
+            if api_key not in self.clients:
+                self.clients[api_key] = genai.Client(api_key=api_key)
+            return self.clients[api_key]
+
+    def frame(self, image_path):
+        """Prepared frame for image_path; re-read only when the file changes on disk."""
+        stat = os.stat(image_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            asset = self.frames.get(image_path)
+            if asset and asset.signature == signature:
+                return asset
+
+        with open(image_path, "rb") as f:
+            raw_bytes = f.read()
+        data, mime_type = self.downscale(raw_bytes)
+        asset = FrameAsset(image_path, signature, raw_bytes, data, mime_type)
+        with self.lock:
+            self.frames[image_path] = asset
+        return asset
+
+    def downscale(self, raw_bytes):
+        """Fits the frame inside native_size and re-encodes it as PNG. Returns the original if that is not smaller."""
+        try:
+            from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, QSize, Qt
+            from PyQt6.QtGui import QImage
+        except ImportError:
+            return raw_bytes, "image/png"
+
+        image = QImage.fromData(raw_bytes)
+        if image.isNull():
+            return raw_bytes, "image/png"
+        width, height = self.native_size
+        if image.width() > width or image.height() > height:
+            image = image.scaled(QSize(width, height), Qt.AspectRatioMode.KeepAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+
+        encoded = QByteArray()
+        buffer = QBuffer(encoded)
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        image.save(buffer, "PNG")
+        buffer.close()
+        data = bytes(encoded)
+        if not data or len(data) >= len(raw_bytes):
+            return raw_bytes, "image/png"
+        return data, "image/png"
+
+    def inline_image(self, asset):
+        return {"image_bytes": asset.data, "mime_type": asset.mime_type}
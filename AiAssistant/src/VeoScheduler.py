@@ -0,0 +1,134 @@
+import asyncio
+import itertools
+import threading
+from src.Tracing import tracer
+
+FIRST_SENTENCE_CAP = 100 # Characters of the reply's first sentence that make it into the Veo prompt
+
+def construct_veo_prompt(text):
+    """
+    Use the first sentence as Dialogue. add in relevant details if the character says they are doing something.
+    """
+    # Look for text between asterisks e.g. *waves hand*
+    #actions = re.findall(r'\*(.*?)\*', text)
+    
+    #if actions:
+        # Use the first action found
+        #action_desc = actions[0]
+        #return f"Cinematic shot. The character performs this action: {action_desc}. High quality, 4k, fluid motion."
+    #else:
+        # Use the first sentence for dialogue lip-sync style context
+    first_sentence = text.split('.')[0]
+    if len(first_sentence) > FIRST_SENTENCE_CAP: first_sentence = first_sentence[:FIRST_SENTENCE_CAP]
+    return f"Cinematic shot. The character is speaking conversationally. Context: {first_sentence}. Maintain eye contact, subtle movement."
+
+def veo_prompt_settled(text):
+    """
+    True once more reply text can no longer change construct_veo_prompt(text),
+    so a streamed reply can start its Veo job before the rest of it arrives.
+    """
+    return "." in text or len(text) >= FIRST_SENTENCE_CAP
+
+class VeoJob:
+    """One Veo generation request and everything the scheduler learns about it along the way."""
+
+    def __init__(self, prompt, image_path, character=None, request_id=None, on_done=None, on_ready=None, owner=None):
+        self.prompt = prompt
+        self.image_path = image_path
+        self.character = character
+        self.request_id = request_id # Which chat reply this clip belongs to
+        self.owner = owner           # Which conversation request_id counts in (None for the desktop app)
+        self.on_done = on_done       # Called with the job once it settles (not called if superseded)
+        self.on_ready = on_ready     # Called with (job, partial_path) once enough of the clip is on disk to start playing
+
+        self.status = "queued"       # queued -> running -> done / failed / superseded
+        self.client = None
+        self.operation = None
+        self.cache_key = None
+        self.result_path = None
+        self.checksum = None
+        self.error = None
+        self.polls = 0
+        self.task = None
+
+class VeoScheduler:
+    """
+    Runs every Veo job on one asyncio loop in a background thread.
+    Polling backs off exponentially, at most max_concurrent jobs run at once,
+    and jobs for replies the user has moved past are cancelled.
+    """
+
+    def __init__(self, model, max_concurrent=2, poll_initial=2.0, poll_max=20.0, poll_factor=1.5):
+        self.model = model
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.poll_factor = poll_factor
+        self.jobs = {}
+        self.ids = itertools.count(1)
+
+        self.loop = asyncio.new_event_loop()
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.thread = threading.Thread(target=self.loop.run_forever, name="VeoScheduler", daemon=True)
+        self.thread.start()
+
+    def submit(self, prompt, image_path, character=None, request_id=None, on_done=None, on_ready=None, owner=None):
+        job = VeoJob(prompt, image_path, character, request_id, on_done, on_ready, owner)
+        self.loop.call_soon_threadsafe(self._start, next(self.ids), job)
+        return job
+
+    def supersede(self, request_id, owner=None):
+        """Cancels every job of the same owner that belongs to a reply older than request_id."""
+        self.loop.call_soon_threadsafe(self._supersede, request_id, owner)
+
+    def pending(self):
+        return len(self.jobs)
+
+    def shutdown(self):
+        for job in list(self.jobs.values()):
+            self.loop.call_soon_threadsafe(job.task.cancel)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _start(self, job_id, job):
+        job.task = self.loop.create_task(self._run(job))
+        self.jobs[job_id] = job
+        job.task.add_done_callback(lambda _: self.jobs.pop(job_id, None))
+
+    def _supersede(self, request_id, owner):
+        for job in list(self.jobs.values()):
+            if job.owner == owner and job.request_id is not None and job.request_id < request_id:
+                job.status = "superseded"
+                job.task.cancel()
+
+    async def _run(self, job):
+        # Whole job, queueing included: "veo_start"/"veo_poll"/"veo_download" spans break it down
+        span = tracer.start("veo_job", character=job.character, request_id=job.request_id)
+        try:
+            async with self.semaphore:
+                job.status = "running"
+                # SDK calls are blocking, so each step runs in the loop's executor
+                settled = await self.loop.run_in_executor(None, self.model.begin_veo_job, job)
+
+                delay = self.poll_initial
+                while not settled:
+                    await asyncio.sleep(delay)
+                    job.polls += 1
+                    settled = await self.loop.run_in_executor(None, self.model.poll_veo_job, job)
+                    delay = min(delay * self.poll_factor, self.poll_max)
+
+                if job.result_path is None and job.error is None:
+                    await self.loop.run_in_executor(None, self.model.finish_veo_job, job)
+
+        except asyncio.CancelledError:
+            job.status = "superseded"
+            span.end(status=job.status, polls=job.polls)
+            print(f"Veo 3 job for reply {job.request_id} superseded.")
+            return
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            job.error = f"Veo 3 Generation Failed: {str(e)}"
+
+        job.status = "done" if job.result_path else "failed"
+        span.end(status=job.status, polls=job.polls)
+        if job.on_done:
+            job.on_done(job)
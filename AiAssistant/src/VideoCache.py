@@ -0,0 +1,128 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+class VideoCache:
+    """
+    Content-addressed on-disk store for generated Veo clips.
+    Clips live in <cache_dir>/<character>/<key>.mp4 and are evicted by age and total size (LRU).
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024**3, max_age=7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes   # Total size across all characters
+        self.max_age = max_age       # Seconds since last use before a clip expires
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_name, prompt, start_frame, end_frame, aspect_ratio):
+        # Length-prefix every field so ("ab", "c") and ("a", "bc") never collide
+        h = hashlib.sha256()
+        for field in (model_name, prompt, start_frame, end_frame, aspect_ratio):
+            if field is None:
+                field = b""
+            if isinstance(field, str):
+                field = field.encode("utf-8")
+            h.update(len(field).to_bytes(8, "big"))
+            h.update(field)
+        return h.hexdigest()
+
+    def char_dir(self, character):
+        # Keep folder names filesystem-safe whatever the character is called
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", character or "default")
+        return os.path.join(self.cache_dir, safe)
+
+    def path_for(self, character, key):
+        return os.path.join(self.char_dir(character), f"{key}.mp4")
+
+    def get(self, character, key):
+        """Returns the cached clip path, or None on a miss."""
+        path = self.path_for(character, key)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        if self.max_age and time.time() - st.st_mtime > self.max_age:
+            self._remove(path)
+            return None
+
+        # Bump mtime so eviction treats this clip as recently used
+        try: os.utime(path, None)
+        except OSError: pass
+        return path
+
+    def temp_path(self, character):
+        """Reserves a temporary file next to the final location so commit() is a same-disk rename."""
+        char_dir = self.char_dir(character)
+        os.makedirs(char_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=char_dir, suffix=".part")
+        os.close(fd)
+        return path
+
+    def commit(self, character, key, temp_path):
+        """Atomically moves a finished download into the cache and returns its final path."""
+        final_path = self.path_for(character, key)
+        try:
+            os.replace(temp_path, final_path)
+        except PermissionError:
+            # Temp file is still open for progressive playback (Windows); publish a copy and sweep the temp later
+            copy_path = self.temp_path(character)
+            shutil.copyfile(temp_path, copy_path)
+            os.replace(copy_path, final_path)
+        self.evict()
+        return final_path
+
+    def discard(self, temp_path):
+        self._remove(temp_path)
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            now = time.time()
+            if not os.path.isdir(self.cache_dir):
+                return
+
+            for char_name in os.listdir(self.cache_dir):
+                char_dir = os.path.join(self.cache_dir, char_name)
+                if not os.path.isdir(char_dir):
+                    continue
+                for name in os.listdir(char_dir):
+                    path = os.path.join(char_dir, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    # Leftover temp files from crashed or progressive downloads
+                    if name.endswith(".part"):
+                        if now - st.st_mtime > 3600:
+                            self._remove(path)
+                        continue
+                    if not name.endswith(".mp4"):
+                        continue
+                    # 1. Drop anything past its age limit
+                    if self.max_age and now - st.st_mtime > self.max_age:
+                        self._remove(path)
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+
+            # 2. Drop least recently used clips until we fit the size budget
+            total = sum(size for _, size, _ in entries)
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if self._remove(path):
+                    total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            # File may be open in the media player (Windows); try again next eviction
+            return False
@@ -1,17 +1,24 @@
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, 
-                             QLineEdit, QPushButton, QLabel, QComboBox, 
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QListView, 
+                             QAbstractItemView, QLineEdit, QPushButton, QLabel, QComboBox, 
                              QSizePolicy, QFrame, QSlider, QCheckBox) # Added QCheckBox
-from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
-from PyQt6.QtMultimediaWidgets import QVideoWidget
-from PyQt6.QtCore import Qt, QUrl
-from PyQt6.QtGui import QPixmap
+import os
+from PyQt6.QtCore import Qt, QSize, pyqtSignal
+from PyQt6.QtGui import QKeySequence, QShortcut, QPixmap
+from src.MediaPool import MediaPool, PixmapCache, ImageLoader
+from src.Transcript import TranscriptModel, MessageDelegate
+from src.Tracing import tracer
 
 class AIView(QWidget):
+    trace_recorded = pyqtSignal(dict) # Finished spans, re-emitted on the GUI thread for the latency overlay
+
     def __init__(self, controller):
         super().__init__()
         self.controller = controller
         self.setWindowTitle("AI Agent Assistant")
         self.resize(1000, 800)
+        self.streaming_rows = {} # request id -> transcript position of the Agent message being grown chunk by chunk
+        self.play_span = None        # Open "play_to_first_frame" span for the clip being started
+        self.latest_spans = {}       # Span name -> last duration, shown in the latency overlay
         self.init_ui()
 
     def init_ui(self):
@@ -22,10 +29,20 @@ class AIView(QWidget):
         # --- Left Side: Chat Interface ---
         chat_layout = QVBoxLayout()
         
-        self.chat_display = QTextEdit()
-        self.chat_display.setReadOnly(True)
+        # Transcript: bounded message model in a list view that only lays out visible rows
+        self.transcript = TranscriptModel()
+        self.chat_display = QListView()
+        self.chat_display.setModel(self.transcript)
+        self.chat_display.setItemDelegate(MessageDelegate(self.chat_display))
+        self.chat_display.setWordWrap(True)
+        self.chat_display.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.chat_display.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.chat_display.setResizeMode(QListView.ResizeMode.Adjust)
+        self.chat_display.setLayoutMode(QListView.LayoutMode.Batched)
+        self.chat_display.setBatchSize(50)
+        self.chat_display.verticalScrollBar().valueChanged.connect(self.on_transcript_scrolled)
         self.chat_display.setStyleSheet("""
-            QTextEdit {
+            QListView {
                 background-color: #2b2b2b; 
                 color: #e0e0e0; 
                 font-size: 14px; 
@@ -43,7 +60,13 @@ class AIView(QWidget):
         self.send_btn.setStyleSheet("padding: 8px; font-weight: bold;")
         self.send_btn.clicked.connect(self.send_clicked)
 
+        # Shows how many messages are waiting behind the current reply
+        self.queue_label = QLabel()
+        self.queue_label.setStyleSheet("color: #888; font-size: 12px;")
+        self.queue_label.hide()
+
         chat_layout.addWidget(self.chat_display)
+        chat_layout.addWidget(self.queue_label)
         input_row = QHBoxLayout()
         input_row.addWidget(self.input_field)
         input_row.addWidget(self.send_btn)
@@ -57,23 +80,39 @@ class AIView(QWidget):
         self.stack_layout = QVBoxLayout(self.char_container)
         self.stack_layout.setContentsMargins(0, 0, 0, 0)
 
-        # Video & Audio
-        self.video_widget = QVideoWidget()
-        self.media_player = QMediaPlayer()
-        self.audio_output = QAudioOutput() 
-        self.media_player.setAudioOutput(self.audio_output)
-        self.audio_output.setVolume(1.0)
-        self.media_player.setVideoOutput(self.video_widget)
+        # Video & Audio: a few pre-loaded players, swapped on screen without a gap
+        self.media_pool = MediaPool()
+        self.media_pool.set_volume(1.0)
+        self.media_pool.frame_shown.connect(self.idle_label_hide)
+        self.media_pool.frame_shown.connect(self.end_play_span)
+        self.media_status_changed = self.media_pool.media_status_changed
         
         # Idle Image
         self.idle_label = QLabel()
         self.idle_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.idle_label.setScaledContents(True)
+        # Idle images are decoded and scaled once per character, off the GUI thread
+        self.pixmap_cache = PixmapCache()
+        self.image_loader = ImageLoader(QSize(405, 720))
+        self.image_loader.loaded.connect(self.on_image_loaded)
+        self.wanted_idle = None # Image the idle label should show once it is decoded
 
-        self.stack_layout.addWidget(self.video_widget)
-        self.video_widget.hide() 
+        for widget in self.media_pool.widgets():
+            self.stack_layout.addWidget(widget)
         self.stack_layout.addWidget(self.idle_label)
 
+        # Latency overlay (F3), drawn over the character
+        self.latency_overlay = QLabel(self.char_container)
+        self.latency_overlay.setStyleSheet("background-color: rgba(0, 0, 0, 170); color: #7fff7f; "
+                                           "font-family: monospace; font-size: 11px; padding: 4px; border: none;")
+        self.latency_overlay.move(4, 4)
+        self.latency_overlay.hide()
+        QShortcut(QKeySequence("F3"), self, activated=self.toggle_latency_overlay)
+        self.trace_recorded.connect(self.show_trace)
+        tracer.listeners.append(self.trace_recorded.emit)
+        if os.getenv("AI_LATENCY_OVERLAY"):
+            self.latency_overlay.show()
+
         # Controls
         self.char_selector = QComboBox()
         self.char_selector.setStyleSheet("padding: 5px;")
@@ -94,6 +133,7 @@ class AIView(QWidget):
         self.veo_checkbox = QCheckBox("Enable Generative Video (Veo)")
         self.veo_checkbox.setToolTip("Generates new videos on the fly based on response. Slow!")
         self.veo_checkbox.setStyleSheet("font-weight: bold; margin-top: 5px;")
+        self.veo_checkbox.toggled.connect(self.controller.on_veo_toggled)
 
         right_layout = QVBoxLayout()
         right_layout.addWidget(self.char_selector)
@@ -118,26 +158,106 @@ class AIView(QWidget):
     def send_clicked(self):
         text = self.input_field.text()
         if text:
-            self.chat_display.append(f"<br><b>You:</b> {text}")
+            self.add_message("You", text)
             self.input_field.clear()
             # Pass the toggle state to the controller
             use_veo = self.veo_checkbox.isChecked()
             self.controller.handle_user_input(text, use_veo)
 
-    def update_chat(self, text):
-        self.chat_display.append(f"<b>Agent:</b> {text}<br>")
+    def add_message(self, speaker, text):
+        follow = self.transcript_at_bottom()
+        position = self.transcript.append_message(speaker, text, trim=follow)
+        if follow:
+            self.chat_display.scrollToBottom()
+        return position
+
+    def append_chat_chunk(self, request_id, text):
+        # First chunk opens this reply's Agent message; later chunks extend that row in place,
+        # even if the user or another lane has added messages below it since
+        if request_id not in self.streaming_rows:
+            self.streaming_rows[request_id] = self.add_message("Agent", text)
+            return
+        follow = self.transcript_at_bottom()
+        self.transcript.append_to_message(self.streaming_rows[request_id], text)
+        if follow:
+            self.chat_display.scrollToBottom()
+
+    def update_chat(self, text, request_id=None):
+        if self.streaming_rows.pop(request_id, None) is not None:
+            # Message is already on screen
+            return
+        self.add_message("Agent", text)
+
+    def transcript_at_bottom(self):
+        bar = self.chat_display.verticalScrollBar()
+        return bar.value() >= bar.maximum() - 4
+
+    def on_transcript_scrolled(self, value):
+        # Reaching the top pages the previous messages back in from disk
+        if value != self.chat_display.verticalScrollBar().minimum() or not self.transcript.can_load_older():
+            return
+        loaded = self.transcript.load_older()
+        if loaded:
+            # Keep the message that was at the top in view
+            self.chat_display.scrollTo(self.transcript.index(loaded), QAbstractItemView.ScrollHint.PositionAtTop)
+
+    def set_queue_depth(self, depth):
+        if depth > 0:
+            self.queue_label.setText(f"{depth} message(s) queued")
+            self.queue_label.show()
+        else:
+            self.queue_label.hide()
 
     def set_idle_image(self, image_path):
-        pixmap = QPixmap(image_path)
-        self.idle_label.setPixmap(pixmap)
-        self.video_widget.hide()
+        self.wanted_idle = image_path
+        pixmap = self.pixmap_cache.peek(image_path)
+        if pixmap is not None:
+            self.idle_label.setPixmap(pixmap)
+        else:
+            self.image_loader.load(image_path) # Previous picture stays up until on_image_loaded
+        self.media_pool.hide_video()
         self.idle_label.show()
 
-    def play_video(self, video_path):
-        self.media_player.setSource(QUrl.fromLocalFile(video_path))
+    def on_image_loaded(self, image_path, image):
+        self.image_loader.finished(image_path)
+        pixmap = QPixmap.fromImage(image)
+        self.pixmap_cache.put(image_path, pixmap)
+        if image_path == self.wanted_idle:
+            self.idle_label.setPixmap(pixmap)
+
+    def forget_image(self, image_path):
+        self.pixmap_cache.forget(image_path)
+
+    def preload_videos(self, video_paths):
+        self.media_pool.preload(video_paths)
+
+    def idle_label_hide(self):
         self.idle_label.hide()
-        self.video_widget.show()
-        self.media_player.play()
+
+    def play_video(self, video_path):
+        # Current picture stays up until the new clip's first frame is ready (see MediaPool.on_frame)
+        if self.play_span:
+            self.play_span.end(replaced=True)
+        self.play_span = tracer.start("play_to_first_frame", clip=os.path.basename(video_path))
+        self.media_pool.play(video_path)
+
+    def end_play_span(self):
+        if self.play_span:
+            self.play_span.end()
+            self.play_span = None
+
+    def toggle_latency_overlay(self):
+        self.latency_overlay.setVisible(not self.latency_overlay.isVisible())
+
+    def show_trace(self, record):
+        self.latest_spans[record["name"]] = record["duration"]
+        lines = [f"{name:20} {seconds * 1000:8.0f} ms" for name, seconds in sorted(self.latest_spans.items())]
+        self.latency_overlay.setText("\n".join(lines))
+        self.latency_overlay.adjustSize()
+        self.latency_overlay.raise_()
+
+    def is_video_playing(self):
+        return self.media_pool.is_playing()
 
     def change_volume(self, value):
-        self.audio_output.setVolume(value / 100.0)
\ No newline at end of file
+        self.media_pool.set_volume(value / 100.0)
\ No newline at end of file